@@ -0,0 +1,119 @@
+"""
+Alias matching for the tracked entities (see entity_vars in ner.py).
+"""
+import bisect
+import re
+from collections import defaultdict
+
+
+class AliasMatcher:
+    """
+    Resolves the aliases of all tracked entities in one linear pass over a string.
+    The aliases are merged into a trie, which is compiled into a single regular expression.
+
+    Matches are leftmost-longest and non-overlapping, and respect word boundaries:
+    an alias only matches when it is not directly preceded or followed by a letter, digit or underscore.
+    'Corps' therefore does not match inside 'Corpsman', and 'U.S. Army Corps of Engineers' counts once
+    and not also as 'Corps'. With case_sensitive=False aliases and text are lowercased before matching.
+    """
+
+    def __init__(self, entity_vars, case_sensitive=True):
+        self.case_sensitive = case_sensitive
+        self.aliases = defaultdict(set)
+
+        for entity, variations in entity_vars.items():
+            for variation in variations:
+                self.aliases[self.normalize(variation)].add(entity)
+
+        self.pattern = re.compile(r'(?<!\w)' + trie_pattern(build_trie(self.aliases)) + r'(?!\w)')
+
+    def normalize(self, alias):
+        return alias if self.case_sensitive else alias.lower()
+
+    def finditer(self, text):
+        """
+        Yields (start, end, entities) for every alias occurrence in text.
+        Positions refer to the normalized text, which only differs for case-insensitive matching.
+        """
+        for match in self.pattern.finditer(self.normalize(text)):
+            yield match.start(), match.end(), self.aliases[match.group()]
+
+    def count(self, text):
+        """
+        Counts the alias occurrences in text per entity.
+        Returns a dictionary entity -> count, entities without matches are left out.
+        """
+        counts = defaultdict(int)
+
+        for match in self.pattern.findall(self.normalize(text)):
+            for entity in self.aliases[match]:
+                counts[entity] += 1
+
+        return counts
+
+    def entities(self, text):
+        """
+        Returns the set of entities with at least one alias in text.
+        """
+        found = set()
+
+        for match in self.pattern.findall(self.normalize(text)):
+            found.update(self.aliases[match])
+
+        return found
+
+    def index(self, strings):
+        """
+        Resolves many short strings, such as an entity dictionary, in a single pass.
+        The strings are joined by newlines, so they must not contain newlines themselves.
+        Returns a dictionary entity -> list of indices of the strings containing one of its aliases.
+        """
+        strings = [self.normalize(string) for string in strings]
+        text = '\n'.join(strings)
+        starts = [0]
+        for string in strings[:-1]:
+            starts.append(starts[-1] + len(string) + 1)
+
+        indices = defaultdict(list)
+
+        for start, _, entities in self.finditer(text):
+            position = bisect.bisect_right(starts, start) - 1
+            for entity in entities:
+                if not indices[entity] or indices[entity][-1] != position:
+                    indices[entity].append(position)
+
+        return indices
+
+
+def build_trie(aliases):
+    """
+    Builds a character trie (nested dictionaries) of the aliases.
+    The empty key marks the end of an alias.
+    """
+    trie = {}
+
+    for alias in aliases:
+        node = trie
+        for char in alias:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    return trie
+
+
+def trie_pattern(node):
+    """
+    Converts a trie into a regular expression without redundant alternatives.
+    Continuations are optional and greedy, so the longest alias is tried first.
+    """
+    branches = [re.escape(char) + trie_pattern(child) for char, child in sorted(node.items()) if char]
+
+    if not branches:
+        return ''
+
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    if '' in node:
+        return '(?:' + pattern + ')?'
+
+    return pattern
@@ -0,0 +1,90 @@
+"""
+Code used to choose the spaCy pipeline for preprocess() in ner.py.
+Runs every (model size, profile) configuration on the same fixed sample of documents and
+reports throughput and entity count agreement with the en_core_web_lg full pipeline baseline.
+"""
+import os
+import random
+import time
+from collections import Counter
+
+import pandas as pd
+
+from ner import excluded_labels, load_pipeline, stream_chunks
+
+configurations = [('lg', 'full'), ('lg', 'ner'), ('md', 'ner'), ('sm', 'ner')]
+
+
+def sample_files(data_folder='../data/', sample_size=50, seed=0):
+    """
+    Draws a fixed random sample of .txt files from all year folders.
+    """
+    files = []
+
+    for year in sorted(os.listdir(data_folder)):
+        year_folder = os.path.join(data_folder, year)
+        if os.path.isdir(year_folder):
+            files.extend(os.path.join(year_folder, file_name) for file_name in sorted(os.listdir(year_folder)) if file_name.endswith('.txt'))
+
+    return random.Random(seed).sample(files, min(sample_size, len(files)))
+
+
+def count_entities(nlp, files, chunk_size=100000, batch_size=8):
+    """
+    Runs a pipeline over the files (in windows without overlap) and counts the entity strings.
+    Returns (counts, number of characters).
+    """
+    windows = (window for input_file in files for window, _, _, _ in stream_chunks(input_file, chunk_size, 0))
+    counts = Counter()
+    n_chars = 0
+
+    for doc in nlp.pipe(windows, batch_size=batch_size):
+        n_chars += len(doc.text)
+        counts.update(entity.text for entity in doc.ents)
+
+    return counts, n_chars
+
+
+def benchmark(sample_size=50, seed=0, configurations=configurations, data_folder='../data/'):
+    """
+    Benchmarks the configurations, the first one is the baseline.
+    Agreement is the weighted Jaccard similarity of the entity counts with the baseline,
+    precision and recall treat the baseline entities as the reference.
+    Returns (and prints) a DataFrame with one row per configuration.
+    """
+    files = sample_files(data_folder, sample_size, seed)
+    baseline = None
+    rows = []
+
+    for model_size, profile in configurations:
+        nlp = load_pipeline(model_size, profile, excluded_labels)
+
+        start = time.perf_counter()
+        counts, n_chars = count_entities(nlp, files)
+        elapsed = time.perf_counter() - start
+
+        if baseline is None:
+            baseline = counts
+
+        overlap = sum((counts & baseline).values())
+        rows.append({
+            'model': f"en_core_web_{model_size}",
+            'profile': profile,
+            'components': ', '.join(nlp.pipe_names),
+            'docs/sec': len(files) / elapsed,
+            'chars/sec': n_chars / elapsed,
+            'entities': sum(counts.values()),
+            'agreement': overlap / max(sum((counts | baseline).values()), 1),
+            'precision': overlap / max(sum(counts.values()), 1),
+            'recall': overlap / max(sum(baseline.values()), 1),
+        })
+
+    results = pd.DataFrame(rows)
+    print(f"Benchmark on {len(files)} documents (seed {seed}):")
+    print(results.to_string(index=False, float_format='{:.3f}'.format))
+
+    return results
+
+
+if __name__ == '__main__':
+    benchmark()
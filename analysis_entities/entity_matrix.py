@@ -0,0 +1,221 @@
+"""
+Code used to store the entity counts of every document, so new views do not need a pass over the corpus.
+build_matrix() counts the aliases of entity_vars (see ner.py) in every document of DATA_FOLDER/<year>/*.txt
+and saves a sparse documents x entities matrix (scipy CSR) to ./entity_matrix.npz, together with the entity
+names. The document metadata (year, country, file_name, url) is saved in the same row order to
+./entity_documents.parquet. Near-duplicate documents are skipped.
+
+The country and url of a document come from the crawl state of /preprocessing/scraper.py: the case page of
+its pdf is looked up in /analysis_global/worldmap.csv, cases that are not listed there are US cases.
+Without a crawl state, the url is the expected case document url and the country is unknown.
+
+aggregate(), timeline(), by_country() and top_documents() answer the dashboard questions with sparse reductions.
+"""
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from aliases import AliasMatcher
+from ner import entity_vars, load_duplicates, candidate_url
+
+
+def build_matrix(data_folder='../data/', matrix_file='./entity_matrix.npz', metadata_file='./entity_documents.parquet', state_file='../preprocessing/crawl_state.json', worldmap_file='../analysis_global/worldmap.csv', processes=None):
+    """
+    Counts the entities of all documents, one task per year folder in a process pool, and saves the matrix and metadata.
+    Returns (matrix, entities, metadata).
+    """
+    start = time.perf_counter()
+    entities = list(entity_vars)
+    years = sorted(year for year in os.listdir(data_folder) if year.isnumeric() and os.path.isdir(os.path.join(data_folder, year)))
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = list(executor.map(count_year, years, [data_folder] * len(years)))
+
+    file_names, rows, indptr, indices, data = [], [], [0], [], []
+    for year, documents in zip(years, results):
+        for file_name, columns, counts in documents:
+            file_names.append(file_name)
+            rows.append(int(year))
+            indices.extend(columns)
+            data.extend(counts)
+            indptr.append(len(indices))
+
+    matrix = sp.csr_matrix(
+        (np.array(data, dtype=np.int32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+        shape=(len(file_names), len(entities)),
+    )
+
+    countries, urls = document_sources(file_names, rows, state_file, worldmap_file)
+    metadata = pd.DataFrame({
+        'year': pd.array(rows, dtype='int16'),
+        'country': pd.Categorical(countries),
+        'file_name': pd.array(file_names, dtype='string'),
+        'url': pd.array(urls, dtype='string'),
+    })
+
+    save_matrix(matrix, entities, matrix_file)
+    metadata.to_parquet(metadata_file, compression='zstd')
+
+    print(f"{matrix.shape[0]} documents x {matrix.shape[1]} entities ({matrix.nnz} counts) saved in {time.perf_counter() - start:.1f}s")
+
+    return matrix, entities, metadata
+
+
+def count_year(year, data_folder='../data/'):
+    """
+    Counts the entities of the documents of one year folder, near-duplicates are skipped.
+    Returns list of (file name, entity columns, counts) with only the non-zero counts.
+    """
+    matcher = AliasMatcher(entity_vars)
+    columns = {entity: column for column, entity in enumerate(entity_vars)}
+    duplicates = load_duplicates(os.path.join(data_folder, 'duplicates.csv'))
+    folder_path = os.path.join(data_folder, year)
+    documents = []
+
+    for file_name in sorted(os.listdir(folder_path)):
+        if file_name.endswith('.txt') and f"{year}/{file_name}" not in duplicates:
+            with open(os.path.join(folder_path, file_name), 'r', encoding='utf-8') as file:
+                counts = matcher.count(file.read())
+
+            found = [(columns[entity], count) for entity, count in counts.items() if count > 0]
+            documents.append((file_name, [column for column, _ in found], [count for _, count in found]))
+
+    return documents
+
+
+def document_sources(file_names, years, state_file, worldmap_file):
+    """
+    Finds the country and url of every document from the crawl state and the world map cases.
+    Returns (countries, urls).
+    """
+    if not os.path.exists(state_file):
+        return [None] * len(file_names), [candidate_url(file_name) for file_name in file_names]
+
+    with open(state_file, 'r') as f:
+        state = json.load(f)
+
+    case_countries = {}
+    if os.path.exists(worldmap_file):
+        cases = pd.read_csv(worldmap_file)
+        case_countries = dict(zip(cases['link'].str.rstrip('/'), cases['country_mapped']))
+
+    # Text files are named after their pdf: <year>/<name>.txt for .../<year>/<name>.pdf.
+    # The same file name can occur in several years, so the year is part of the key.
+    sources = {}
+    for url, record in state['pdfs'].items():
+        year, name = pdf_location(url)
+        case = (record.get('case') or '').rstrip('/')
+        country = case_countries.get(case, 'USA' if case else None)
+        sources.setdefault((year, os.path.splitext(name)[0] + '.txt'), (country, url))
+
+    countries, urls = [], []
+    for file_name, year in zip(file_names, years):
+        country, url = sources.get((str(year), file_name), (None, candidate_url(file_name)))
+        countries.append(country)
+        urls.append(url)
+
+    return countries, urls
+
+
+def pdf_location(url):
+    """
+    Returns the (year folder, file name) a pdf url is downloaded to, as in pdf_path() of /preprocessing/scraper.py:
+    the year is taken from the url (.../case-documents/<year>/<name>.pdf) or from the file name.
+    """
+    parts = urlsplit(url).path.split('/')
+    name = parts[-1]
+
+    if len(parts) > 1 and parts[-2].isnumeric() and len(parts[-2]) == 4:
+        return parts[-2], name
+    if name[:4].isnumeric():
+        return name[:4], name
+
+    return 'unknown', name
+
+
+def save_matrix(matrix, entities, matrix_file):
+    """
+    Saves a CSR matrix in the format of scipy.sparse.save_npz, with the entity names (columns) added.
+    """
+    np.savez_compressed(
+        matrix_file,
+        format=np.array('csr'),
+        shape=np.array(matrix.shape),
+        data=matrix.data,
+        indices=matrix.indices,
+        indptr=matrix.indptr,
+        entities=np.array(entities),
+    )
+
+
+def load_matrix(matrix_file='./entity_matrix.npz', metadata_file='./entity_documents.parquet'):
+    """
+    Loads the saved (matrix, entities, metadata).
+    """
+    matrix = sp.load_npz(matrix_file).tocsr()
+
+    with np.load(matrix_file) as saved:
+        entities = saved['entities'].tolist()
+
+    return matrix, entities, pd.read_parquet(metadata_file)
+
+
+def aggregate(matrix, entities, labels):
+    """
+    Sums the document rows per label (e.g. the year or country column of the metadata).
+    Returns DataFrame entity x label.
+    """
+    codes, uniques = pd.factorize(labels, sort=True)
+    valid = codes >= 0
+    indicator = sp.csr_matrix((np.ones(valid.sum(), dtype=np.int32), (codes[valid], np.flatnonzero(valid))), shape=(len(uniques), matrix.shape[0]))
+
+    totals = (indicator @ matrix).toarray()
+
+    return pd.DataFrame(totals.T, index=pd.Index(entities, name='Entity'), columns=uniques)
+
+
+def timeline(matrix, entities, metadata):
+    """
+    Entity frequencies per year (the layout of entities_timeline.csv), most frequent entities first.
+    """
+    totals = aggregate(matrix, entities, metadata['year'].to_numpy())
+    totals.columns = totals.columns.astype(str)
+
+    return totals.loc[totals.sum(axis=1).sort_values(ascending=False, kind='stable').index]
+
+
+def by_country(matrix, entities, metadata):
+    """
+    Entity frequencies per country.
+    """
+    return aggregate(matrix, entities, metadata['country'].astype(object).to_numpy())
+
+
+def top_documents(matrix, entities, metadata, entity, top_k=10, years=None, countries=None):
+    """
+    Returns the metadata of the top_k documents with the most mentions of an entity (added as count column),
+    optionally only documents of the given years and countries.
+    """
+    counts = matrix[:, entities.index(entity)].toarray().ravel()
+
+    mask = counts > 0
+    if years is not None:
+        mask &= metadata['year'].isin(years).to_numpy()
+    if countries is not None:
+        mask &= metadata['country'].isin(countries).to_numpy()
+
+    rows = np.flatnonzero(mask)
+    # Stable sort: ties keep the document order (year, then file name)
+    best = rows[np.argsort(-counts[rows], kind='stable')[:top_k]]
+
+    return metadata.iloc[best].assign(count=counts[best])
+
+
+if __name__ == '__main__':
+    build_matrix()
@@ -1,63 +1,326 @@
 import csv
+import hashlib
+import heapq
+import json
 import os
 import spacy
+from spacy.language import Language
 from collections import defaultdict
-import re
+from concurrent.futures import ProcessPoolExecutor
+import time
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
-import requests
+from aliases import AliasMatcher
+from url_check import validate_urls
 
 
-def preprocess():
+excluded_labels = ["CARDINAL", "ORDINAL", "DATE", "TIME", "PERCENT", "MONEY", "QUANTITY", "GPE", "LOC"]
+
+# Components of en_core_web_* that doc.ents does not depend on
+unused_components = ["tagger", "parser", "attribute_ruler", "lemmatizer", "senter", "morphologizer"]
+
+
+@Language.factory("entity_filter", default_config={"excluded_labels": []})
+def create_entity_filter(nlp, name, excluded_labels):
+    """
+    Pipeline component that removes entities with an excluded label from doc.ents.
+    """
+    excluded = set(excluded_labels)
+
+    def entity_filter(doc):
+        doc.ents = [entity for entity in doc.ents if entity.label_ not in excluded]
+        return doc
+
+    return entity_filter
+
+
+def load_pipeline(model_size='lg', profile='ner', excluded_labels=excluded_labels):
+    """
+    Loads en_core_web_sm, _md or _lg for NER.
+    Profile 'full' runs the complete pipeline, profile 'ner' excludes the unused_components,
+    and tok2vec as well when the ner component does not listen to it (it has its own in sm/md/lg).
+    Entities with an excluded label are filtered inside the pipeline by entity_filter.
+    """
+    model_name = f"en_core_web_{model_size}"
+
+    if profile == 'full':
+        nlp = spacy.load(model_name)
+    elif profile == 'ner':
+        nlp = spacy.load(model_name, exclude=unused_components)
+        if 'tok2vec' in nlp.pipe_names and 'ner' not in nlp.get_pipe('tok2vec').listening_components:
+            nlp.remove_pipe('tok2vec')
+    else:
+        raise ValueError(f"Unknown profile: {profile}")
+
+    nlp.add_pipe("entity_filter", config={"excluded_labels": list(excluded_labels)})
+
+    return nlp
+
+
+def preprocess(n_process=1, batch_size=8, cache_folder='./ner_cache/', chunk_size=100000, overlap=2000, model_size='lg', profile='ner'):
     """
     Code used to preprocess .txt files and apply NER analysis with SpaCy.
     Iterates through year-based folders and computes NER statistics for each year.
-    Output is saved to file: ./YEAR_ner_statistics.txt
+    Documents are streamed through nlp.pipe, n_process > 1 spreads them over worker processes.
+    The pipeline is loaded with load_pipeline(model_size, profile), by default only the components NER needs.
+    Files are read incrementally in overlapping windows of at most chunk_size characters, so no document is skipped.
+    Entity counts per document are cached by content hash, so reruns only annotate new or changed files.
+    Near-duplicate documents listed in ../data/duplicates.csv (see /preprocessing/dedup.py) are skipped.
+    Output is saved to the columnar store: ./ner_statistics.parquet
     """
     input_folders = ["1990", "1992", "1994", "1997", "2003", "2004", "2005", "2006", "2007", "2008", "2009", "2010", "2011", "2012", "2013", "2014", "2015", "2016", "2017", "2018", "2019", "2020", "2021", "2023", "2022"]
-    excluded_labels = ["CARDINAL", "ORDINAL", "DATE", "TIME", "PERCENT", "MONEY", "QUANTITY", "GPE", "LOC"]
 
-    nlp = spacy.load('en_core_web_lg')
-    nlp.max_length = 5000000
+    if overlap >= chunk_size // 4:
+        raise ValueError("overlap must be smaller than a quarter of chunk_size")
+
+    nlp = load_pipeline(model_size, profile, excluded_labels)
+    nlp.max_length = max(nlp.max_length, chunk_size)
+
+    # The counts depend on the window parameters, so they are part of the cache key
+    cache_file = os.path.join(cache_folder, f"en_core_web_{model_size}-{nlp.meta['version']}-{profile}-{chunk_size}-{overlap}.json")
+    cache = load_cache(cache_file, excluded_labels)
+    duplicates = load_duplicates()
 
-    all_ner_stats = defaultdict(int)
+    year_stats = {}
+    total_documents = 0
+    total_start = time.perf_counter()
 
     for input_folder in input_folders:
         input_folder_path = os.path.join("../data/", input_folder)
 
         ner_stats = defaultdict(int)
+        document_keys = []
+        n_documents = 0
+        start = time.perf_counter()
 
-        for file_name in os.listdir(input_folder_path):
-            if file_name.endswith(".txt"):
-                input_file = os.path.join(input_folder_path, file_name)
+        windows = read_documents(input_folder_path, cache, document_keys, chunk_size, overlap, duplicates)
 
-                try:
-                    with open(input_file, "r") as f:
-                        text = f.read()
-                except:
-                    print("Error occurred in processing of the file:", file_name)
-                    continue
+        # Windows arrive in order, counts are collected per document until its last window
+        counts = defaultdict(int)
+        covered_until = 0
+
+        for doc, (key, window_start, owned_until, last_window) in nlp.pipe(windows, as_tuples=True, n_process=n_process, batch_size=batch_size):
+            for entity in doc.ents:
+                entity_start = window_start + entity.start_char
 
-                cleaned_text = preprocess_text(text)
-                
-                if len(cleaned_text) > nlp.max_length:
-                    print(f"Text length exceeds maximum limit for file {input_file}.")
+                # Entities in the overlap belong to the next window, parts of an already counted entity are dropped
+                if entity_start < covered_until or entity_start >= owned_until:
                     continue
 
-                doc = nlp(cleaned_text)
+                covered_until = window_start + entity.end_char
+                counts[entity.text] += 1
+
+            if last_window:
+                cache['documents'][key] = dict(counts)
+                counts = defaultdict(int)
+                covered_until = 0
+                n_documents += 1
+
+        save_cache(cache_file, cache)
+
+        # Merge cached counts in directory order, so the output equals a full rebuild
+        for key in document_keys:
+            for entity, frequency in cache['documents'].get(key, {}).items():
+                ner_stats[entity] += frequency
+
+        year_stats[int(input_folder)] = ner_stats
+
+        elapsed = time.perf_counter() - start
+        total_documents += n_documents
+        print(f"NER statistics for {input_folder} collected ({n_documents} annotated, {len(document_keys) - n_documents} cached, {n_documents / elapsed:.2f} docs/sec)")
+
+    output_file = save_statistics(year_stats)
+    print(f"NER statistics saved to {output_file}")
+
+    total_elapsed = time.perf_counter() - total_start
+    print(f"Annotated {total_documents} documents in {total_elapsed:.1f}s ({total_documents / total_elapsed:.2f} docs/sec, n_process={n_process})")
+
+
+def read_documents(input_folder_path, cache, document_keys, chunk_size, overlap, duplicates=frozenset()):
+    """
+    Reads the .txt files of one year folder, in directory order, skipping near-duplicates.
+    Appends the content hash of every file to document_keys. The hash is computed in its own block-wise
+    pass (file_hash()) before the file is streamed, because the cache decides whether it is annotated at all.
+    For files that are not in the cache yet, yields the windows of stream_chunks() as (text, context),
+    with context (hash, window start, owned until, last window). Unreadable files are skipped.
+    Used as input stream for nlp.pipe in preprocess().
+    """
+    queued = set()
+    year = os.path.basename(os.path.normpath(input_folder_path))
+
+    for file_name in os.listdir(input_folder_path):
+        if file_name.endswith(".txt") and f"{year}/{file_name}" not in duplicates:
+            input_file = os.path.join(input_folder_path, file_name)
+
+            try:
+                key = file_hash(input_file)
+            except OSError:
+                print("Error occurred in processing of the file:", file_name)
+                continue
+
+            document_keys.append(key)
+
+            if key in cache['documents'] or key in queued:
+                continue
+
+            queued.add(key)
+
+            for window, window_start, owned_until, last_window in stream_chunks(input_file, chunk_size, overlap):
+                yield window, (key, window_start, owned_until, last_window)
+
+
+def load_duplicates(duplicates_file='../data/duplicates.csv'):
+    """
+    Loads the near-duplicate documents found by /preprocessing/dedup.py.
+    Returns a set of 'year/file name' strings, empty when dedup.py has not been run.
+    """
+    if not os.path.exists(duplicates_file):
+        return set()
+
+    with open(duplicates_file, 'r', newline='') as f:
+        return {row['document'] for row in csv.DictReader(f)}
+
+
+def file_hash(input_file, block_size=1 << 20):
+    """
+    Computes the SHA-256 hash of a file, reading it in blocks.
+    """
+    digest = hashlib.sha256()
+
+    with open(input_file, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def stream_chunks(input_file, chunk_size, overlap):
+    """
+    Reads a .txt file incrementally and cleans it with preprocess_text() block by block.
+    Yields windows of at most chunk_size characters as (text, window start, owned until, last window).
+    Every window is cut at a sentence boundary, the next window starts about overlap characters earlier
+    (again at a sentence boundary) so entities around the cut are seen with context.
+    Entities starting before 'owned until' are counted by this window, the rest by the next one.
+    Offsets are positions in the cleaned document. Memory use is bounded by chunk_size, runs without
+    whitespace longer than chunk_size are split.
+    """
+    buffer = ''
+    buffer_start = 0
+    rest = ''
+    finished = False
+
+    with open(input_file, 'r', encoding='utf-8', errors='replace') as f:
+        while not finished:
+            data = f.read(chunk_size)
+            finished = len(data) < chunk_size
+            block, rest = rest + data, ''
+
+            if not finished:
+                # Only clean up to the last whitespace, a split token is carried into the next block.
+                # A block without whitespace (e.g. bad pdf extraction) is split at chunk_size, so rest stays bounded.
+                split = max(block.rfind(' '), block.rfind('\n'), block.rfind('\t'))
+                if split == -1:
+                    split = chunk_size
+                block, rest = block[:split], block[split:]
+
+            cleaned = preprocess_text(block)
+            if cleaned:
+                buffer = buffer + ' ' + cleaned if buffer else cleaned
+
+            while len(buffer) > chunk_size:
+                cut = find_boundary(buffer, chunk_size // 2, chunk_size)
+                next_start = find_boundary(buffer, cut - 2 * overlap, cut - overlap) if overlap else cut
+
+                yield buffer[:cut], buffer_start, buffer_start + next_start, False
+
+                buffer = buffer[next_start:]
+                buffer_start += next_start
+
+    yield buffer, buffer_start, buffer_start + len(buffer), True
+
+
+def find_boundary(text, start, end):
+    """
+    Finds the position right after the last sentence end in text[start:end].
+    Falls back to the last space, or to end if the range contains neither.
+    """
+    position = max(text.rfind(sentence_end, start, end) for sentence_end in ('. ', '? ', '! '))
+    if position != -1:
+        return position + 2
+
+    position = text.rfind(' ', start, end)
+    if position != -1:
+        return position + 1
+
+    return end
+
+
+def load_cache(cache_file, excluded_labels):
+    """
+    Loads the per-document entity count cache of one model version and window size.
+    The cache is keyed by file content hash, the model name, version, profile, chunk_size and overlap are part of the file name.
+    A cache built with other excluded labels is discarded.
+    """
+    cache = {'excluded_labels': sorted(excluded_labels), 'documents': {}}
+
+    if os.path.exists(cache_file):
+        with open(cache_file, 'r') as f:
+            stored = json.load(f)
+
+        if stored.get('excluded_labels') == cache['excluded_labels']:
+            cache = stored
+        else:
+            print(f"Excluded labels changed, rebuilding cache {cache_file}.")
+
+    return cache
+
+
+def save_cache(cache_file, cache):
+    """
+    Writes the entity count cache to disk.
+    Written to a temporary file first, so an interrupted run never leaves a corrupt cache.
+    """
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    temp_file = cache_file + '.tmp'
+
+    with open(temp_file, 'w') as f:
+        json.dump(cache, f)
+
+    os.replace(temp_file, cache_file)
+
 
-                for entity in doc.ents:
-                    if entity.label_ not in excluded_labels:
-                        ner_stats[entity.text] += 1
-                        all_ner_stats[entity.text] += 1
-                
+def save_statistics(year_stats, output_file='./ner_statistics.parquet'):
+    """
+    Saves the entity frequencies of all years in one columnar store.
+    Entities are stored once as a dictionary (categorical), years and counts as integer columns.
+    Returns the path of the output file.
+    """
+    years = []
+    entities = []
+    counts = []
 
-        output_file = os.path.join('./', f"{input_folder}_ner_statistics.txt")
-        with open(output_file, 'w') as f:
-            for entity, frequency in ner_stats.items():
-                f.write(f"NER: {entity}\tFrequency: {frequency}\n")
+    for year, ner_stats in year_stats.items():
+        years.extend([year] * len(ner_stats))
+        entities.extend(ner_stats.keys())
+        counts.extend(ner_stats.values())
 
-        print(f"NER statistics for {input_folder} saved to {output_file}")
+    stats = pd.DataFrame({
+        'year': np.array(years, dtype=np.int16),
+        'entity': pd.Categorical(entities),
+        'count': np.array(counts, dtype=np.int64),
+    })
+    stats.to_parquet(output_file, index=False, compression='zstd')
+
+    return output_file
+
+
+def load_statistics(input_file='./ner_statistics.parquet'):
+    """
+    Loads the columnar store written by preprocess().
+    Returns a DataFrame with columns year, entity (categorical) and count.
+    """
+    return pd.read_parquet(input_file)
 
 
 def preprocess_text(text):
@@ -87,50 +350,19 @@ def preprocess_text(text):
 def combined_data():
     """
     Computes top 50 most common entities throughout all years.
-    Uses .txt files generated by preprocess() and creates one csv file.
+    Uses the store generated by preprocess() and creates one csv file.
     """
-    input_folder_path = "./"
     output_file = './output/output_data.csv'
     top_50 = './output/top_50.csv'
 
-    all_ner_stats = defaultdict(int)
+    stats = load_statistics()
+    totals = stats.groupby('entity', observed=True)['count'].sum()
 
-    for file_name in os.listdir(input_folder_path):
-        if file_name.endswith(".txt"):
-            input_file = os.path.join(input_folder_path, file_name)
+    totals.rename('Frequency').to_csv(output_file, index_label='NER', escapechar="\\")
+    print("Succesfully saved data to output.")
 
-            with open(input_file, "r") as f:
-                lines = f.readlines()
-                    
-                for line in lines:
-                    match = re.match(r'NER:\s*(.*?)\s*Frequency:\s*(\d+)', line)
-                    
-                    if match:
-                        word = match.group(1)
-                        frequency = int(match.group(2))
-                        if word not in all_ner_stats:
-                            all_ner_stats[word] = frequency
-                        else:
-                            all_ner_stats[word] += frequency
-
-                
-    with open(output_file, 'w', newline='') as o:
-        writer = csv.writer(o, escapechar="\\")
-        writer.writerow(['NER', 'Frequency'])
-        
-        for word, frequency in all_ner_stats.items():
-            writer.writerow([word, frequency])
-        
-        print("Succesfully saved data to output.")
-        
-    sorted_entities = sorted(all_ner_stats.items(), key=lambda x: x[1], reverse=True)[:50]
-    with open(top_50, 'w', newline='') as t:
-        writer = csv.writer(t, escapechar="\\")
-        writer.writerow(['NER', 'Frequency'])
-        for word, frequency in sorted_entities:
-            writer.writerow([word, frequency])
-        
-        print("Succesfully saved top 50 to output.")
+    totals.nlargest(50).rename('Frequency').to_csv(top_50, index_label='NER', escapechar="\\")
+    print("Succesfully saved top 50 to output.")
 
 
 entity_vars = {
@@ -155,44 +387,28 @@ entity_vars = {
 def gather_stats():
     """
     Generates csv file of frequencies for top 15 entities (+variations) through time.
-    Iterates through output files from preprocess() to create dictionary of counts.
+    Resolves the variations once against the entity dictionary of the store generated by preprocess(),
+    then sums the counts of all matching rows per year.
     Saves output in csv file.
     """
-    entity_stats = defaultdict(dict)
-
-    for file_name in os.listdir('.'):
-        if file_name.endswith('.txt') and re.match(r'\d{4}_ner_statistics\.txt', file_name):
-           year = re.search(r'(\d{4})', file_name).group(1)
-    
-        with open(file_name, 'r') as f:
-            lines = f.readlines()
-
-            year_entity_stats = {entity: 0 for entity in entity_vars}
+    stats = load_statistics()
+    codes = stats['entity'].cat.codes.to_numpy()
+    years = sorted(stats['year'].unique())
 
-            for line in lines:
-                match = re.match(r'NER:\s*(.*?)\s*Frequency:\s*(\d+)', line)
-                if match:
-                    word = match.group(1)
-                    frequency = int(match.group(2))
+    matcher = AliasMatcher(entity_vars, case_sensitive=False)
+    matching_codes = matcher.index(stats['entity'].cat.categories)
 
-                    for entity, variations in entity_vars.items():
-                        if any(variation.lower() in word.lower() for variation in variations):
-                            year_entity_stats[entity] += frequency
+    entity_stats = {}
 
-            for entity, frequency in year_entity_stats.items():
-                entity_stats[entity][year] = frequency
+    for entity in entity_vars:
+        selected = stats[np.isin(codes, matching_codes[entity])]
+        entity_stats[entity] = selected.groupby('year')['count'].sum().reindex(years, fill_value=0)
 
-    sorted_entities = sorted(entity_stats.keys(), key=lambda x: sum(entity_stats[x].values()), reverse=True)
+    timeline = pd.DataFrame(entity_stats).T
+    timeline = timeline.loc[timeline.sum(axis=1).sort_values(ascending=False, kind='stable').index]
 
     csv_file_path = './output/entities_timelinedata.csv'
-    
-    with open(csv_file_path, 'w', newline='') as csv_file:
-        writer = csv.writer(csv_file)
-        writer.writerow(['Entity'] + sorted(entity_stats[sorted_entities[0]].keys()))
-
-        for entity in sorted_entities:
-            row = [entity] + [entity_stats[entity].get(year, 0) for year in sorted(entity_stats[entity].keys())]
-            writer.writerow(row)
+    timeline.to_csv(csv_file_path, index_label='Entity')
 
 
 def get_documents(year):
@@ -200,38 +416,60 @@ def get_documents(year):
     Finds document with highest frequency for each entity in given year.
     Returns dictionary with the file names. 
     """
-    entities = list(entity_vars.keys())
-    entity_documents = {entity: '' for entity in entities}
-    entity_counts = {entity: 0 for entity in entities}
-    
+    ranking = rank_year(year)
+
+    return {entity: documents[0][1] if documents else '' for entity, documents in ranking.items()}
+
+
+def rank_year(year, top_k=1):
+    """
+    Ranks the documents of one year folder for all entities in a single pass.
+    Every file is read once and all aliases are counted together with the AliasMatcher.
+    Returns dictionary entity -> list of (count, file name), best first, with at most top_k documents.
+    Ties go to the first file in directory order, near-duplicates are skipped.
+    """
+    matcher = AliasMatcher(entity_vars)
+    heaps = {entity: [] for entity in entity_vars}
+    duplicates = load_duplicates()
+
     folder_path = f"../data/{year}"
- 
-    for file_name in os.listdir(folder_path):
-        if file_name.endswith('.txt'):
+
+    for index, file_name in enumerate(os.listdir(folder_path)):
+        if file_name.endswith('.txt') and f"{year}/{file_name}" not in duplicates:
             file_path = os.path.join(folder_path, file_name)
             with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
-                for entity in entities:
-                    entity_variations = entity_vars[entity]
-                    entity_count = 0
-                    for variation in entity_variations:
-                        count = text.count(variation)
-                        entity_count += count
-                        if entity_count > entity_counts[entity]:
-                            entity_counts[entity] = entity_count
-                            entity_documents[entity] = file_name
-            
-    return entity_documents
-
-
-def doc_overview(output_file):
-    """
-    Uses get_documents() to create csv file for all entity/year combinations.
+                counts = matcher.count(file.read())
+
+            for entity, count in counts.items():
+                item = (count, -index, file_name)
+                heap = heaps[entity]
+
+                if len(heap) < top_k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+    return {entity: [(count, file_name) for count, _, file_name in sorted(heap, reverse=True)] for entity, heap in heaps.items()}
+
+
+def rank_documents(years, top_k=1, processes=None):
+    """
+    Scans the year folders once, in parallel over a process pool (one task per year).
+    Returns dictionary year -> entity -> list of (count, file name) as given by rank_year().
+    """
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        rankings = executor.map(rank_year, years, [top_k] * len(years))
+        return dict(zip(years, rankings))
+
+
+def doc_overview(output_file, processes=None):
+    """
+    Uses rank_documents() to create csv file for all entity/year combinations.
     Output displays documents with highest frequency for entity in year.
     """
     entities = list(entity_vars.keys())
     years = range(2004, 2024)
-    entity_documents = {year: get_documents(year) for year in years}
+    rankings = rank_documents(years, processes=processes)
 
     with open(output_file, 'w', newline='') as f:
         writer = csv.writer(f)
@@ -241,73 +479,94 @@ def doc_overview(output_file):
         for entity in entities:
             row = [entity]
             for year in years:
-                document = entity_documents[year][entity]
-                row.append(document)
+                documents = rankings[year][entity]
+                row.append(documents[0][1] if documents else '')
             writer.writerow(row)
 
 
+manual_urls = {
+    '2014-13726.txt': 'http://www.gpo.gov/fdsys/pkg/FR-2014-06-18/pdf/2014-13726.pdf',
+    '2016-24215.txt': 'https://www.govinfo.gov/content/pkg/FR-2016-11-18/pdf/2016-24215.pdf',
+    '2014-18742.txt': 'https://www.govinfo.gov/content/pkg/FR-2014-08-07/pdf/2014-18742.pdf',
+    '20210526_8918_judgment-1.txt': 'http://climatecasechart.com/wp-content/uploads/sites/16/non-us-case-documents/2021/20210526_8918_judgment-1.pdf',
+    '2011-20740.txt': 'https://www.govinfo.gov/content/pkg/FR-2011-09-15/pdf/2011-20740.pdf',
+    '20191113_8918_reply.txt': 'http://climatecasechart.com/wp-content/uploads/sites/16/non-us-case-documents/2019/20191113_8918_reply.pdf',
+    '2010-3851.txt': 'https://www.govinfo.gov/content/pkg/FR-2010-03-26/pdf/2010-3851.pdf'
+}
+
+case_documents_url = 'http://climatecasechart.com/wp-content/uploads/sites/16/case-documents/'
+
+
 def valid_url(url):
     """
     Tests whether a given url is valid.
     """  
-    response = requests.head(url)
-    return response.status_code == requests.codes.ok
+    return validate_urls([url])[url]
 
 
-def get_url(name):
+def candidate_url(name, base_url=case_documents_url):
     """
-    Matches file name (string) to valid url or None.
+    Matches file name (string) to the url it should have, without checking it.
     Dictionary of manual_urls is changed manually (invalid urls).
-    Returns valid url or None.
+    Returns url or None.
     """
-    manual_urls = {
-        '2014-13726.txt': 'http://www.gpo.gov/fdsys/pkg/FR-2014-06-18/pdf/2014-13726.pdf',
-        '2016-24215.txt': 'https://www.govinfo.gov/content/pkg/FR-2016-11-18/pdf/2016-24215.pdf',
-        '2014-18742.txt': 'https://www.govinfo.gov/content/pkg/FR-2014-08-07/pdf/2014-18742.pdf',
-        '20210526_8918_judgment-1.txt': 'http://climatecasechart.com/wp-content/uploads/sites/16/non-us-case-documents/2021/20210526_8918_judgment-1.pdf',
-        '2011-20740.txt': 'https://www.govinfo.gov/content/pkg/FR-2011-09-15/pdf/2011-20740.pdf',
-        '20191113_8918_reply.txt': 'http://climatecasechart.com/wp-content/uploads/sites/16/non-us-case-documents/2019/20191113_8918_reply.pdf',
-        '2010-3851.txt': 'https://www.govinfo.gov/content/pkg/FR-2010-03-26/pdf/2010-3851.pdf'
-    }
-    
-    if name.strip("'") in manual_urls:
+    name = name.strip("'")
+
+    if name in manual_urls:
         return manual_urls[name]
-    
-    url = None
+
     year = name[:4]
-    
+
     if year.isnumeric():
-        base_url = 'http://climatecasechart.com/wp-content/uploads/sites/16/case-documents/year'
-        url = base_url.replace('year', year) + '/' + name.replace('.txt', '.pdf')
+        return base_url + year + '/' + name.replace('.txt', '.pdf')
 
-        try:
-            if not valid_url(url):
-                url = None
-        except:
-            url = None
-    
-    return url
+    return None
 
 
-def doc_url(input_file, output_file):
+def get_url(name, base_url=case_documents_url):
+    """
+    Matches file name (string) to valid url or None.
+    Urls from manual_urls are trusted, other urls are checked with validate_urls().
+    Returns valid url or None.
+    """
+    url = candidate_url(name, base_url)
+
+    if url is None or name.strip("'") in manual_urls:
+        return url
+
+    return url if valid_url(url) else None
+
+
+def doc_url(input_file, output_file, base_url=case_documents_url):
     """
     Finds url's for each file name (string).
+    All candidate url's are checked concurrently in one batch by validate_urls().
     Adds valid url's to cell or leaves invalid url's emtpy.
     Output is saved to csv file.
     """        
     with open(input_file, 'r') as file:
         reader = csv.reader(file)
         rows = list(reader)
-        header = rows[0]
-        output_rows = [header]
-        
-        for row in rows[1:]:
-            output_row = row.copy()
-            for i, cell in enumerate(row):
-                if i > 0 and cell.endswith('.txt'):
-                    url = get_url(cell.strip("'"))
-                    output_row[i] = url
-            output_rows.append(output_row)
+
+    candidates = {}
+
+    for row in rows[1:]:
+        for i, cell in enumerate(row):
+            if i > 0 and cell.endswith('.txt'):
+                candidates[cell] = candidate_url(cell, base_url)
+
+    to_check = [url for cell, url in candidates.items() if url is not None and cell.strip("'") not in manual_urls]
+    valid = validate_urls(to_check)
+
+    output_rows = [rows[0]]
+
+    for row in rows[1:]:
+        output_row = row.copy()
+        for i, cell in enumerate(row):
+            if i > 0 and cell in candidates:
+                url = candidates[cell]
+                output_row[i] = url if url is None or valid.get(url, True) else None
+        output_rows.append(output_row)
 
     with open(output_file, 'w', newline='') as file:
         writer = csv.writer(file)
@@ -331,10 +590,10 @@ if __name__ == '__main__':
 **METHODE**
 
 1. Preprocessen txt data -> preprocess() en preprocess_text()
-    - Opslaan dictionary van entities + frequencies per jaar.
-    - Format: "NER: <entity> Frequency: <frequency>" in .txt file.
+    - Opslaan entities + frequencies per jaar.
+    - Format: kolom-opslag ner_statistics.parquet (year, entity, count), entities als dictionary.
 2. Top 50 meestvoorkomende entities verzamelen -> combined_data()
-    - Alle unieke entities in dict opslaan + itereren door year files voor optellen frequencies.
+    - Frequencies per entity optellen met een group-by over ner_statistics.parquet.
 3. Handmatig non-entities verwijderen uit csv bestand.
     - Verwijderde entities: 
         Court, NEPA, Fed, Project, State, ESA, Congress, Commission, 
@@ -352,7 +611,7 @@ if __name__ == '__main__':
     - Corporate:             2x
     - NGO:                   1x
     - Politics:              1x
-5. Itereren door year_ner_statistics.txt files en frequencies per entity per jaar optellen -> gather_stats().
+5. Variaties matchen in ner_statistics.parquet en frequencies per entity per jaar optellen -> gather_stats().
 6. Output csv file voor datavisualisatie opstellen -> entities_timeline.csv
 7. Opstellen overzicht documenten met hoogste frequentie voor elke entity per jaar:
     - doc_overview(): csv bestand met bestandsnamen (strings)
@@ -0,0 +1,87 @@
+"""
+Code used to build the document index queried by the dashboard (see /document_index.py).
+build_index() writes an SQLite database with
+- documents: id, year, country, file_name and url of every document (see entity_matrix.document_sources()),
+- mentions: the count of every entity of entity_vars per document (same counting as rank_year() in ner.py),
+- aliases: the aliases of every entity of entity_vars,
+- documents_fts: an FTS5 full-text index of the texts (contentless, positions kept),
+- positions: the offsets of every term per document (packed little-endian int32), copied from the fts5vocab instance table
+  documents_vocab, so a phrase is counted from the positions of its terms in only the documents that match it.
+Near-duplicate documents are skipped. The database is written to a temporary file and renamed when complete.
+"""
+import itertools
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from entity_matrix import count_year, document_sources
+from ner import entity_vars
+
+schema = """
+CREATE TABLE documents (id INTEGER PRIMARY KEY, year INTEGER, country TEXT, file_name TEXT, url TEXT);
+CREATE TABLE mentions (entity TEXT, doc INTEGER, count INTEGER);
+CREATE TABLE aliases (alias TEXT, entity TEXT);
+CREATE VIRTUAL TABLE documents_fts USING fts5(text, content='', detail=full);
+CREATE VIRTUAL TABLE documents_vocab USING fts5vocab(documents_fts, 'instance');
+CREATE TABLE positions (term TEXT, doc INTEGER, offsets BLOB, PRIMARY KEY (term, doc)) WITHOUT ROWID;
+"""
+
+
+def build_index(data_folder='../data/', index_file='./documents.sqlite', state_file='../preprocessing/crawl_state.json', worldmap_file='../analysis_global/worldmap.csv', processes=None):
+    """
+    Builds the document index. The entity mentions are counted in a process pool (one task per year folder)
+    while the texts are added to the full-text index.
+    """
+    start = time.perf_counter()
+    entities = list(entity_vars)
+    years = sorted(year for year in os.listdir(data_folder) if year.isnumeric() and os.path.isdir(os.path.join(data_folder, year)))
+
+    temp_file = index_file + '.tmp'
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+
+    connection = sqlite3.connect(temp_file)
+    connection.executescript(schema)
+    documents = []
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for year, counted in zip(years, executor.map(count_year, years, [data_folder] * len(years))):
+            # count_year() lists the same (sorted, non-duplicate) documents of the year
+            for file_name, columns, counts in counted:
+                doc = len(documents) + 1
+                documents.append((doc, int(year), file_name))
+
+                with open(os.path.join(data_folder, year, file_name), 'r', encoding='utf-8') as file:
+                    connection.execute("INSERT INTO documents_fts (rowid, text) VALUES (?, ?)", (doc, file.read()))
+
+                connection.executemany("INSERT INTO mentions VALUES (?, ?, ?)", [(entities[column], doc, count) for column, count in zip(columns, counts)])
+
+    countries, urls = document_sources([file_name for _, _, file_name in documents], [year for _, year, _ in documents], state_file, worldmap_file)
+    connection.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?)", [(doc, year, country, file_name, url) for (doc, year, file_name), country, url in zip(documents, countries, urls)])
+
+    connection.executemany("INSERT INTO aliases VALUES (?, ?)", [(alias, entity) for entity, variations in entity_vars.items() for alias in variations])
+
+    connection.executescript("""
+        CREATE INDEX mentions_entity ON mentions (entity, count DESC);
+        CREATE INDEX documents_year ON documents (year, country);
+        INSERT INTO documents_fts (documents_fts) VALUES ('optimize');
+    """)
+
+    # The instance table lists the offsets ordered by term, document and offset, so they are packed per (term, document) in one pass
+    instances = connection.cursor().execute("SELECT term, doc, offset FROM documents_vocab")
+    connection.executemany("INSERT INTO positions VALUES (?, ?, ?)", (
+        (term, doc, np.fromiter((offset for _, _, offset in rows), dtype='<i4').tobytes())
+        for (term, doc), rows in itertools.groupby(instances, key=lambda row: (row[0], row[1]))
+    ))
+    connection.commit()
+    connection.close()
+
+    os.replace(temp_file, index_file)
+    print(f"{len(documents)} documents indexed to {index_file} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    build_index()
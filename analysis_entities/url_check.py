@@ -0,0 +1,121 @@
+"""
+Asynchronous validation of document urls, used by get_url() and doc_url() in ner.py.
+"""
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import aiohttp
+
+
+def validate_urls(urls, cache_file='./url_cache.json', ttl=7 * 24 * 3600, concurrency=20, host_interval=0.1, retries=3, timeout=10):
+    """
+    Tests whether the given urls are valid (HEAD request answered with 200 OK).
+    Results are cached on disk for ttl seconds, only unknown or expired urls go over the network.
+    Requests share one connection pool, at most `concurrency` run at the same time
+    and requests to the same host are at least `host_interval` seconds apart.
+    Returns dictionary url -> bool.
+    """
+    cache = load_url_cache(cache_file)
+    now = time.time()
+    pending = [url for url in set(urls) if url not in cache or now - cache[url]['checked'] > ttl]
+
+    if pending:
+        results = asyncio.run(check_urls(pending, concurrency, host_interval, retries, timeout))
+
+        for url, valid in results.items():
+            # Urls that kept failing with network errors are not cached and retried next run
+            if valid is not None:
+                cache[url] = {'valid': valid, 'checked': now}
+
+        save_url_cache(cache_file, cache)
+
+    return {url: url in cache and cache[url]['valid'] for url in urls}
+
+
+async def check_urls(urls, concurrency, host_interval, retries, timeout):
+    """
+    Checks all urls concurrently with one aiohttp session.
+    Returns dictionary url -> True, False or None (no answer after all retries).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = HostRateLimiter(host_interval)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        results = await asyncio.gather(*(check_url(session, url, semaphore, limiter, retries) for url in urls))
+
+    return dict(zip(urls, results))
+
+
+async def check_url(session, url, semaphore, limiter, retries, backoff=0.5):
+    """
+    Sends a HEAD request for one url, redirects are not followed.
+    Timeouts, connection errors, 429 and 5xx responses are retried with exponential backoff.
+    """
+    for attempt in range(retries + 1):
+        if attempt:
+            await asyncio.sleep(backoff * 2 ** (attempt - 1))
+
+        await limiter.wait(urlsplit(url).netloc)
+
+        async with semaphore:
+            try:
+                async with session.head(url, allow_redirects=False) as response:
+                    status = response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                continue
+
+        if status == 429 or status >= 500:
+            continue
+
+        return status == 200
+
+    return None
+
+
+class HostRateLimiter:
+    """
+    Spaces out requests to the same host by at least `interval` seconds.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_time = defaultdict(float)
+        self.locks = defaultdict(asyncio.Lock)
+
+    async def wait(self, host):
+        async with self.locks[host]:
+            loop = asyncio.get_running_loop()
+            delay = self.next_time[host] - loop.time()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            self.next_time[host] = loop.time() + self.interval
+
+
+def load_url_cache(cache_file):
+    """
+    Loads the url cache: dictionary url -> {'valid': bool, 'checked': timestamp}.
+    """
+    if not os.path.exists(cache_file):
+        return {}
+
+    with open(cache_file, 'r') as f:
+        return json.load(f)
+
+
+def save_url_cache(cache_file, cache):
+    """
+    Writes the url cache to disk via a temporary file.
+    """
+    temp_file = cache_file + '.tmp'
+
+    with open(temp_file, 'w') as f:
+        json.dump(cache, f)
+
+    os.replace(temp_file, cache_file)
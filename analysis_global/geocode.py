@@ -0,0 +1,123 @@
+"""
+Code used to add coordinates to the cases in worldmap.csv.
+Country names are looked up in the bundled centroid table ./centroids.csv (name, country, latitude,
+longitude), without network calls. Names that are not in the table are looked up in a memoization
+cache (./geocode_cache.json) and, only when online=True, geocoded with Nominatim (geopy) once and
+added to that cache. Names that cannot be geocoded get empty coordinates.
+"""
+import csv
+import json
+import os
+import time
+
+
+def add_coordinates(df, column='country', centroid_file='./centroids.csv', cache_file='./geocode_cache.json', online=False):
+    """
+    Adds the country_mapped, latitude and longitude columns for the country names in `column`.
+    Every distinct name is geocoded once. Returns the new DataFrame.
+    """
+    locations = geocode(df[column].unique(), centroid_file, cache_file, online)
+
+    return df.assign(
+        country_mapped=df[column].map(lambda name: locations[name][0]),
+        latitude=df[column].map(lambda name: locations[name][1]),
+        longitude=df[column].map(lambda name: locations[name][2]),
+    )
+
+
+def geocode(names, centroid_file='./centroids.csv', cache_file='./geocode_cache.json', online=False, interval=1.0):
+    """
+    Geocodes country names, from the centroid table, then the cache, then (if online) Nominatim.
+    Nominatim is queried at most once per `interval` seconds, as required by its usage policy.
+    Names that Nominatim did not find are cached as unknown and not queried again.
+    Returns dictionary name -> (country, latitude, longitude), with (None, None, None) for unknown names.
+    """
+    centroids = load_centroids(centroid_file)
+    cache = load_geocode_cache(cache_file)
+    locations = {}
+    missing = []
+
+    for name in names:
+        key = normalize(name)
+        if key in centroids:
+            locations[name] = centroids[key]
+        elif key in cache:
+            # Names cached as None were not found by Nominatim before, they are not queried again
+            locations[name] = tuple(cache[key]) if cache[key] is not None else (None, None, None)
+        else:
+            missing.append(name)
+
+    if missing and online:
+        from geopy.geocoders import Nominatim
+        from geopy.exc import GeopyError
+
+        geolocator = Nominatim(user_agent='esg-dashboard')
+
+        for i, name in enumerate(missing):
+            if i > 0:
+                time.sleep(interval)
+
+            try:
+                location = geolocator.geocode(normalize(name), language='en', timeout=10)
+            except GeopyError as error:
+                print(f"Geocoding failed for {name}: {error!r}")
+                continue
+
+            # Unknown names are cached as None, so they are not queried again (remove them from the cache to retry)
+            cache[normalize(name)] = None if location is None else (location.address.split(',')[-1].strip(), location.latitude, location.longitude)
+
+        save_geocode_cache(cache_file, cache)
+
+        for name in missing:
+            location = cache.get(normalize(name))
+            locations[name] = tuple(location) if location is not None else (None, None, None)
+    else:
+        for name in missing:
+            locations[name] = (None, None, None)
+
+    return locations
+
+
+def normalize(name):
+    """
+    Normalizes a country name or url slug ('united-kingdom') to its lookup key ('united kingdom').
+    """
+    return ' '.join(str(name).lower().replace('-', ' ').replace('_', ' ').split())
+
+
+def load_centroids(centroid_file):
+    """
+    Loads the centroid table: dictionary name -> (country, latitude, longitude).
+    """
+    with open(centroid_file, 'r', newline='') as f:
+        return {row['name']: (row['country'], float(row['latitude']), float(row['longitude'])) for row in csv.DictReader(f)}
+
+
+def load_geocode_cache(cache_file):
+    """
+    Loads the geocoding cache: dictionary name -> [country, latitude, longitude] or None.
+    """
+    if not os.path.exists(cache_file):
+        return {}
+
+    with open(cache_file, 'r') as f:
+        return json.load(f)
+
+
+def save_geocode_cache(cache_file, cache):
+    """
+    Writes the geocoding cache to disk via a temporary file.
+    """
+    temp_file = cache_file + '.tmp'
+
+    with open(temp_file, 'w') as f:
+        json.dump(cache, f, indent=1)
+
+    os.replace(temp_file, cache_file)
+
+
+if __name__ == '__main__':
+    import pandas as pd
+
+    cases = pd.read_csv('./worldmap.csv')
+    add_coordinates(cases).to_csv('./worldmap.csv', index=False)
@@ -0,0 +1,336 @@
+"""
+Code used for the LDA topic modelling per year (the training of lda.ipynb as importable module).
+
+tokenize() converts preprocessed_dataset_final.csv once to a line-delimited token file per year
+(MODEL_FOLDER/tokens_<year>.txt, one document per line, tokens separated by spaces).
+train_topics() then trains the years in parallel, one process per year. Every process streams its
+token file to build the dictionary and the bag-of-words corpus (MmCorpus on disk), and trains the
+LdaModel from the corpus on disk, so memory stays bounded by the model size instead of the data size.
+Per year the dictionary, corpus and model are saved to MODEL_FOLDER, and the pyLDAvis visualization
+data shown by the dashboard to ./lda_vis_<year>.json.gz (compact JSON, rendered by plots.lda()).
+
+update_topics() adds a batch of new documents (e.g. late filings of the current year) to the saved
+models without retraining: the dictionary is extended with the new tokens and the model is updated
+online with only the new documents. A year is retrained from scratch on request, or when the new
+documents drift too far from its model (their perplexity rose by more than a threshold).
+"""
+import ast
+import gzip
+import itertools
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from gensim import corpora
+from gensim.models.ldamodel import LdaModel
+
+
+def tokenize(input_file='./preprocessed_dataset_final.csv', model_folder='./models/', years=range(2013, 2024), chunksize=1000):
+    """
+    Streams the preprocessed dataset in chunks and writes the token lists of each year to its token file.
+    The processed_text column holds stringified lists of tokens, parsed here with ast.literal_eval.
+    Returns dictionary year -> number of documents.
+    """
+    os.makedirs(model_folder, exist_ok=True)
+    files = {year: open(token_path(model_folder, year) + '.tmp', 'w', encoding='utf-8') for year in years}
+    counts = dict.fromkeys(years, 0)
+
+    try:
+        for year, tokens in read_documents(input_file, years, chunksize):
+            files[year].write(' '.join(tokens) + '\n')
+            counts[year] += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    for year in years:
+        os.replace(token_path(model_folder, year) + '.tmp', token_path(model_folder, year))
+
+    print(f"{sum(counts.values())} documents tokenized to {model_folder}")
+
+    return counts
+
+
+def read_documents(input_file, years, chunksize=1000):
+    """
+    Yields (year, token list) for the documents of the given years, reading the file in chunks.
+    Tokens containing whitespace are joined with underscores, so a token file line splits back into the same tokens.
+    """
+    for chunk in pd.read_csv(input_file, usecols=['year', 'processed_text'], chunksize=chunksize):
+        chunk['year'] = pd.to_numeric(chunk['year'], errors='coerce')
+        chunk = chunk[chunk['year'].isin(years)]
+
+        for year, text in zip(chunk['year'].astype(int), chunk['processed_text']):
+            yield year, ['_'.join(token.split()) for token in ast.literal_eval(text) if token and token.strip()]
+
+
+class TokenFile:
+    """
+    Iterates over the token lists of a token file, reading one line (document) at a time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield line.split()
+
+
+def train_topics(years=range(2013, 2024), model_folder='./models/', vis_folder='./', processes=None, num_topics=10, passes=15, random_state=None):
+    """
+    Trains the LDA model of every year in a process pool (by default one process per core).
+    Years without documents are skipped. Returns dictionary year -> path of the saved model.
+    """
+    start = time.perf_counter()
+    years = [year for year in years if os.path.getsize(token_path(model_folder, year)) > 0]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {year: executor.submit(train_year, year, model_folder, vis_folder, num_topics, passes, random_state) for year in years}
+        models = {year: future.result() for year, future in futures.items()}
+
+    print(f"{len(years)} years trained in {time.perf_counter() - start:.1f}s")
+
+    return models
+
+
+def train_year(year, model_folder='./models/', vis_folder='./', num_topics=10, passes=15, random_state=None, token_file=None):
+    """
+    Builds the dictionary and corpus of one year from its token file (by default MODEL_FOLDER/tokens_<year>.txt),
+    trains its LdaModel and saves the dictionary, corpus, model and visualization. Returns the path of the model.
+    """
+    texts = TokenFile(token_file or token_path(model_folder, year))
+
+    dictionary = corpora.Dictionary(texts)
+    dictionary.save(dictionary_path(model_folder, year))
+
+    corpora.MmCorpus.serialize(corpus_path(model_folder, year), (dictionary.doc2bow(text) for text in texts))
+    corpus = corpora.MmCorpus(corpus_path(model_folder, year))
+
+    lda = LdaModel(corpus, num_topics=num_topics, id2word=dictionary, passes=passes, random_state=random_state)
+    lda.save(model_path(model_folder, year))
+
+    # The perplexity on the training documents is the reference for the drift check of update_year()
+    save_metrics(model_folder, year, {'documents': len(corpus), 'perplexity': perplexity(lda, corpus, len(corpus))})
+
+    save_visualization(lda, corpus, dictionary, vis_path(vis_folder, year))
+
+    return model_path(model_folder, year)
+
+
+def update_topics(input_file, years=range(2013, 2024), model_folder='./models/', vis_folder='./', threshold=0.25, retrain=False, **training):
+    """
+    Adds the new documents in input_file (same format as the preprocessed dataset) to the models of their years.
+    Returns dictionary year -> 'updated' or 'retrained', for the years with new documents.
+    """
+    texts_per_year = {}
+    for year, tokens in read_documents(input_file, years):
+        texts_per_year.setdefault(year, []).append(tokens)
+
+    return {year: update_year(year, texts, model_folder, vis_folder, threshold, retrain, **training) for year, texts in sorted(texts_per_year.items())}
+
+
+def update_year(year, texts, model_folder='./models/', vis_folder='./', threshold=0.25, retrain=False, **training):
+    """
+    Adds new documents (token lists) to the saved dictionary, corpus and model of a year and saves its visualization.
+    The model is updated online with only the new documents, unless retrain is set, the year has no model yet,
+    or the perplexity of the new documents exceeds the training perplexity by more than threshold (relative).
+    Then the year is retrained from its token file. Returns 'updated' or 'retrained'.
+    The token file is extended via a temporary file that replaces it only after the update or retraining
+    succeeded, so a failed update can be rerun without adding the documents twice.
+    """
+    os.makedirs(model_folder, exist_ok=True)
+    token_file = token_path(model_folder, year)
+    temp_token_file = token_file + '.tmp'
+
+    with open(temp_token_file, 'w', encoding='utf-8') as f:
+        if os.path.exists(token_file):
+            with open(token_file, 'r', encoding='utf-8') as existing:
+                shutil.copyfileobj(existing, f)
+        f.writelines(' '.join(tokens) + '\n' for tokens in texts)
+
+    try:
+        status = update_model(year, texts, temp_token_file, model_folder, vis_folder, threshold, retrain, **training)
+    except BaseException:
+        os.remove(temp_token_file)
+        raise
+
+    os.replace(temp_token_file, token_file)
+
+    return status
+
+
+def update_model(year, texts, token_file, model_folder, vis_folder, threshold, retrain, **training):
+    """
+    Updates or retrains (from token_file, which already holds the new documents) the model of a year, see update_year().
+    """
+    if not retrain and os.path.exists(model_path(model_folder, year)):
+        lda, dictionary, corpus = load_year(year, model_folder)
+        metrics = load_metrics(model_folder, year) or {'documents': len(corpus), 'perplexity': perplexity(lda, corpus, len(corpus))}
+
+        # Drift: the new documents are scored with the current vocabulary, before it is extended
+        drift = perplexity(lda, [dictionary.doc2bow(tokens) for tokens in texts], metrics['documents']) / metrics['perplexity'] - 1
+        print(f"{year}: perplexity of {len(texts)} new documents is {drift:+.1%} relative to training")
+        retrain = drift > threshold
+
+    if retrain or not os.path.exists(model_path(model_folder, year)):
+        train_year(year, model_folder, vis_folder, token_file=token_file, **training)
+        return 'retrained'
+
+    # New tokens get new ids, the ids of the existing corpus stay valid
+    dictionary.add_documents(texts)
+    extend_vocabulary(lda, dictionary)
+
+    new_corpus = [dictionary.doc2bow(tokens) for tokens in texts]
+    lda.update(new_corpus)
+    lda.save(model_path(model_folder, year))
+    dictionary.save(dictionary_path(model_folder, year))
+
+    temp_path = corpus_path(model_folder, year) + '.tmp'
+    corpora.MmCorpus.serialize(temp_path, itertools.chain(corpus, new_corpus))
+    os.replace(temp_path, corpus_path(model_folder, year))
+    os.replace(temp_path + '.index', corpus_path(model_folder, year) + '.index')
+    corpus = corpora.MmCorpus(corpus_path(model_folder, year))
+
+    metrics['documents'] = len(corpus)
+    save_metrics(model_folder, year, metrics)
+
+    save_visualization(lda, corpus, dictionary, vis_path(vis_folder, year))
+
+    return 'updated'
+
+
+def extend_vocabulary(lda, dictionary):
+    """
+    Grows the topic-word statistics of a model to the size of its (extended) dictionary.
+    New terms start with no observations and the mean prior of the existing terms.
+    """
+    num_new = len(dictionary) - lda.num_terms
+    if num_new <= 0:
+        return
+
+    state = lda.state
+    state.sstats = np.hstack([state.sstats, np.zeros((lda.num_topics, num_new), dtype=state.sstats.dtype)])
+    if state.eta.ndim == 1:
+        state.eta = np.concatenate([state.eta, np.full(num_new, state.eta.mean(), dtype=state.eta.dtype)])
+    else:
+        state.eta = np.hstack([state.eta, np.repeat(state.eta.mean(axis=1, keepdims=True), num_new, axis=1)])
+
+    lda.eta = state.eta
+    lda.num_terms = len(dictionary)
+    lda.id2word = dictionary
+    lda.expElogbeta = np.exp(state.get_Elogbeta())
+
+
+def perplexity(lda, corpus, total_docs, max_documents=2000):
+    """
+    Computes the per-word perplexity of (at most max_documents of) a corpus under a model.
+    The bound is scaled to total_docs documents (the size of the training corpus), so samples of different sizes compare.
+    """
+    sample = list(itertools.islice(corpus, max_documents))
+
+    # Documents with only unknown words cannot be scored
+    if not any(count for document in sample for _, count in document):
+        return float('inf')
+
+    return float(np.exp2(-lda.log_perplexity(sample, total_docs=total_docs)))
+
+
+def load_metrics(model_folder, year):
+    """
+    Loads the saved metrics of a year, or returns None for models trained without metrics.
+    """
+    if not os.path.exists(os.path.join(model_folder, f"metrics_{year}.json")):
+        return None
+
+    with open(os.path.join(model_folder, f"metrics_{year}.json"), 'r') as f:
+        return json.load(f)
+
+
+def save_metrics(model_folder, year, metrics):
+    with open(os.path.join(model_folder, f"metrics_{year}.json"), 'w') as f:
+        json.dump(metrics, f)
+
+
+def save_visualization(lda, corpus, dictionary, output_file):
+    """
+    Saves the pyLDAvis visualization data of a model.
+    """
+    import pyLDAvis.gensim_models as gensimvis
+
+    save_vis_data(json.loads(gensimvis.prepare(lda, corpus, dictionary).to_json()), output_file)
+
+
+def save_vis_data(vis_data, output_file, digits=4):
+    """
+    Writes pyLDAvis data as gzip-compressed JSON without whitespace, with floats rounded to `digits` decimals.
+    """
+    payload = json.dumps(round_floats(vis_data, digits), separators=(',', ':'), ensure_ascii=False)
+
+    temp_file = output_file + '.tmp'
+    with gzip.open(temp_file, 'wt', encoding='utf-8') as f:
+        f.write(payload)
+    os.replace(temp_file, output_file)
+
+
+def convert_html(html_file, output_file):
+    """
+    Extracts the data of a standalone pyLDAvis HTML page (pyLDAvis.save_html) and saves it with save_vis_data().
+    """
+    with open(html_file, 'r', encoding='utf-8') as f:
+        match = re.search(r'var ldavis_el\w+_data = (\{.*?\});\n', f.read(), re.S)
+
+    save_vis_data(json.loads(match.group(1)), output_file)
+
+
+def round_floats(value, digits):
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, list):
+        return [round_floats(item, digits) for item in value]
+    if isinstance(value, dict):
+        return {key: round_floats(item, digits) for key, item in value.items()}
+
+    return value
+
+
+def load_year(year, model_folder='./models/'):
+    """
+    Loads the saved (model, dictionary, corpus) of a year.
+    """
+    lda = LdaModel.load(model_path(model_folder, year))
+    dictionary = corpora.Dictionary.load(dictionary_path(model_folder, year))
+    corpus = corpora.MmCorpus(corpus_path(model_folder, year))
+
+    return lda, dictionary, corpus
+
+
+def vis_path(vis_folder, year):
+    return os.path.join(vis_folder, f"lda_vis_{year}.json.gz")
+
+
+def token_path(model_folder, year):
+    return os.path.join(model_folder, f"tokens_{year}.txt")
+
+
+def dictionary_path(model_folder, year):
+    return os.path.join(model_folder, f"dictionary_{year}.gensim")
+
+
+def corpus_path(model_folder, year):
+    return os.path.join(model_folder, f"corpus_{year}.mm")
+
+
+def model_path(model_folder, year):
+    return os.path.join(model_folder, f"lda_model_{year}.gensim")
+
+
+if __name__ == '__main__':
+    tokenize()
+    train_topics()
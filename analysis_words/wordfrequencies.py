@@ -0,0 +1,159 @@
+"""
+Code used to compute the word frequencies per (Year, Country), the dashboard data source.
+build_frequencies() streams ./words.csv (the Words, Year, Country and Document of every document) in chunks
+and counts the words of each (Year, Country) group in a process pool. The partial counts are merged, every
+distinct word is checked against the enchant en_US dictionary once, and the top words of each group are
+saved as a tidy, typed table (country, year, word, count) in ./word_frequencies.parquet, indexed by
+(country, year) and ordered by rank within each group.
+
+convert_frequencies() converts the older notebook output (stringified lists of (word, count) tuples per
+(Year, Country)) to the same table.
+"""
+import ast
+import heapq
+import os
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+# Characters removed from the stringified token lists in the Words column
+list_characters = str.maketrans('', '', "'[],")
+
+
+def build_frequencies(input_file='./words.csv', output_file='./word_frequencies.parquet', duplicates_file='../data/duplicates.csv', top_n=20, processes=None, chunksize=500, language='en_US'):
+    """
+    Counts the top_n dictionary words per (Year, Country) and saves them with save_table().
+    Near-duplicate documents (see /preprocessing/dedup.py) and the PENDING country are skipped.
+    At most two chunks per process are in flight, so memory is bounded by the vocabulary, not the corpus.
+    Returns the table.
+    """
+    start = time.perf_counter()
+    duplicates = load_duplicate_keys(duplicates_file)
+    counts = defaultdict(Counter)
+    processes = processes or os.cpu_count()
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = set()
+
+        for chunk in pd.read_csv(input_file, index_col=0, chunksize=chunksize):
+            keys = chunk['Year'].astype(int).astype(str) + '/' + chunk['Document'].str.replace('.txt', '', regex=False)
+            chunk = chunk[(chunk['Country'] != 'PENDING') & ~keys.isin(duplicates)]
+            pending.add(executor.submit(count_words, list(zip(chunk['Year'], chunk['Country'], chunk['Words']))))
+
+            if len(pending) >= 2 * processes:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                merge_counts(counts, done)
+
+        merge_counts(counts, pending)
+
+    vocabulary = Vocabulary(language)
+    rows = []
+
+    for year, country in sorted(counts):
+        words = [(word, count) for word, count in counts[(year, country)].items() if vocabulary.check(word)]
+        # Futures finish in any order, so ties are broken by word to get the same table on every run
+        rows.extend((country, year, word, count) for word, count in heapq.nsmallest(top_n, words, key=lambda item: (-item[1], item[0])))
+
+    table = save_table(rows, output_file)
+    print(f"{len(counts)} (country, year) groups counted in {time.perf_counter() - start:.1f}s, {vocabulary.checks} distinct words checked")
+
+    return table
+
+
+def count_words(documents):
+    """
+    Counts the candidate words (lowercase, alphabetic, longer than one letter, no stop word) of documents
+    given as (year, country, stringified token list). Returns dictionary (year, country) -> Counter.
+    """
+    counts = defaultdict(Counter)
+
+    for year, country, words in documents:
+        if isinstance(words, str):
+            tokens = (token.lower() for token in words.translate(list_characters).split())
+            counts[(int(year), country)].update(token for token in tokens if len(token) > 1 and token.isalpha() and token not in ENGLISH_STOP_WORDS)
+
+    return counts
+
+
+def merge_counts(counts, futures):
+    for future in futures:
+        for group, group_counts in future.result().items():
+            counts[group].update(group_counts)
+
+
+class Vocabulary:
+    """
+    Checks words against an enchant dictionary, every distinct word only once.
+    """
+
+    def __init__(self, language='en_US'):
+        import enchant
+
+        self.dictionary = enchant.Dict(language)
+        self.known = {}
+        self.checks = 0
+
+    def check(self, word):
+        if word not in self.known:
+            self.known[word] = self.dictionary.check(word)
+            self.checks += 1
+
+        return self.known[word]
+
+
+def load_duplicate_keys(duplicates_file):
+    """
+    Loads the documents listed in duplicates.csv as <year>/<name> (without extension).
+    The year is part of the key, because the same file name can occur in several years.
+    """
+    if not os.path.exists(duplicates_file):
+        return set()
+
+    duplicates = pd.read_csv(duplicates_file)
+
+    return set(duplicates['document'].str.replace('.txt', '', regex=False))
+
+
+def convert_frequencies(input_file='./groupedfrequencies.csv', output_file='./word_frequencies.parquet'):
+    """
+    Converts a CSV with Year, Country and Frequency columns to the tidy word frequency table.
+    Returns the table.
+    """
+    grouped = pd.read_csv(input_file)
+    rows = []
+
+    for country, year, frequencies in zip(grouped['Country'], grouped['Year'], grouped['Frequency']):
+        if isinstance(frequencies, str):
+            frequencies = ast.literal_eval(frequencies)
+
+        for word, count in frequencies:
+            rows.append((country, year, word, count))
+
+    return save_table(rows, output_file)
+
+
+def save_table(rows, output_file):
+    """
+    Saves (country, year, word, count) rows as the tidy word frequency table. Returns the table.
+    """
+    table = pd.DataFrame(rows, columns=['country', 'year', 'word', 'count'])
+    table = table.astype({
+        'country': pd.CategoricalDtype(pd.unique(table['country'])),
+        'year': 'int16',
+        'word': 'string',
+        'count': 'int32',
+    })
+
+    table = table.set_index(['country', 'year'])
+    table.to_parquet(output_file, compression='zstd')
+
+    print(f"{len(table)} words saved to {output_file}")
+
+    return table
+
+
+if __name__ == '__main__':
+    build_frequencies()
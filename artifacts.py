@@ -0,0 +1,204 @@
+"""
+Compiles the dashboard figures to artifacts, so the dashboard does not build them on startup.
+
+All figures come from data files that only change when the offline pipeline reruns. Running
+`python artifacts.py` after the pipeline renders every figure variant the dashboard can show:
+the timeline bar (all years on its slider), the bubble chart, the word frequencies for every
+(country, year) on the selectors and the world map. Plotly figures are stored as JSON, the map
+as rendered HTML, and the country/year selector values as a pre-parsed word index.
+
+The manifest records the schema version, the code version of plots.py and the content hash of every
+source file. The dashboard only serves an artifact while all of them match, otherwise it builds the
+figure live. So artifacts compiled before a change to the figure builders are not served.
+"""
+import json
+import os
+import threading
+
+import pandas as pd
+import plotly.io as pio
+
+import datasets
+import plots
+from figure_cache import code_version
+
+SCHEMA_VERSION = 2
+
+sources = {
+    'entities': './analysis_entities/entities_timeline.csv',
+    'words': './analysis_words/word_frequencies.parquet',
+    'map': './analysis_global/worldmap.csv',
+}
+
+
+def compile_artifacts(output_folder='./artifacts/', sources=sources):
+    """
+    Renders all figure variants to output_folder and writes its manifest.json.
+    Returns the manifest.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+
+    manifest = {
+        'schema': SCHEMA_VERSION,
+        'code': code_version(plots),
+        'sources': {name: datasets.file_hash(path) for name, path in sources.items()},
+        'artifacts': {},
+        'word_index': {},
+    }
+
+    def add(key, source, payload, extension):
+        file_name = f"{len(manifest['artifacts']):04d}-{key.split('|')[0]}.{extension}"
+        write_file(os.path.join(output_folder, file_name), payload)
+        manifest['artifacts'][key] = {'file': file_name, 'source': source}
+
+    entities = pd.read_csv(sources['entities'])
+    add('timeline_bar', 'entities', plots.timeline_bar(entities).to_json(), 'json')
+    add('bubble_chart', 'entities', plots.bubble_chart(entities).to_json(), 'json')
+
+    # The dashboard offers every year between the first and last year of a country
+    word_frequencies = datasets.read_word_frequencies(sources['words'])
+    for country, year in word_frequencies:
+        manifest['word_index'].setdefault(country, []).append(year)
+
+    for country, years in manifest['word_index'].items():
+        for year in range(min(years), max(years) + 1):
+            figure = plots.grouped_frequency(word_frequencies, country, year)
+            add(artifact_key('grouped_frequency', country, year), 'words', figure.to_json(), 'json')
+
+    world_map = plots.world_map(pd.read_csv(sources['map']))
+    add('world_map', 'map', world_map.get_root().render(), 'html')
+
+    # The manifest is written last, so an interrupted compile leaves the previous manifest in place
+    write_file(os.path.join(output_folder, 'manifest.json'), json.dumps(manifest, indent=1))
+    print(f"{len(manifest['artifacts'])} artifacts saved to {output_folder}")
+
+    return manifest
+
+
+class ArtifactStore:
+    """
+    Serves compiled artifacts. Every getter returns None when the artifact cannot be used:
+    no (readable) manifest, another schema version, figure builders (plots.py) or a source file that
+    changed since compiling.
+    Source files are hashed again only when their mtime or size changed, and the manifest is
+    reloaded when it is rewritten by a new compile.
+    """
+
+    def __init__(self, folder='./artifacts/', sources=sources):
+        self.folder = folder
+        self.sources = sources
+        self.lock = threading.Lock()
+        self.verified = {}
+        self.manifest_stat = None
+        self.manifest = None
+
+    def load_manifest(self):
+        """
+        Returns the manifest, (re)loaded when its file changed, or None when it cannot be used.
+        """
+        manifest_file = os.path.join(self.folder, 'manifest.json')
+
+        try:
+            stat = datasets.file_stat(manifest_file)
+        except OSError:
+            return None
+
+        with self.lock:
+            if stat != self.manifest_stat:
+                self.manifest_stat = stat
+                self.manifest = self.read_manifest(manifest_file)
+                self.verified = {}
+
+            return self.manifest
+
+    def read_manifest(self, manifest_file):
+        try:
+            with open(manifest_file, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get('schema') != SCHEMA_VERSION:
+            print(f"Ignoring artifacts in {self.folder}: schema {manifest.get('schema')}, expected {SCHEMA_VERSION}")
+            return None
+
+        if manifest.get('code') != code_version(plots):
+            print(f"Ignoring artifacts in {self.folder}: compiled with another version of plots.py")
+            return None
+
+        return manifest
+
+    def is_current(self, manifest, source):
+        """
+        Checks whether a source file still has the hash it had when the artifacts were compiled.
+        """
+        path = self.sources[source]
+
+        try:
+            stat = datasets.file_stat(path)
+        except OSError:
+            return False
+
+        with self.lock:
+            if source not in self.verified or self.verified[source][0] != stat:
+                self.verified[source] = (stat, datasets.file_hash(path) == manifest['sources'].get(source))
+
+            return self.verified[source][1]
+
+    def payload(self, key):
+        manifest = self.load_manifest()
+        if manifest is None:
+            return None
+
+        artifact = manifest['artifacts'].get(key)
+        if artifact is None or not self.is_current(manifest, artifact['source']):
+            return None
+
+        try:
+            with open(os.path.join(self.folder, artifact['file']), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def plotly_figure(self, name, *params):
+        """
+        Returns the compiled Plotly figure name(*params), or None.
+        """
+        payload = self.payload(artifact_key(name, *params))
+        return None if payload is None else pio.from_json(payload)
+
+    def map_html(self, name, *params):
+        """
+        Returns the compiled map HTML, or None.
+        """
+        return self.payload(artifact_key(name, *params))
+
+    def word_index(self):
+        """
+        Returns dictionary country -> years with word frequencies, or None.
+        """
+        manifest = self.load_manifest()
+        if manifest is None or not self.is_current(manifest, 'words'):
+            return None
+
+        return manifest['word_index']
+
+
+def artifact_key(name, *params):
+    return '|'.join([name] + [str(param) for param in params])
+
+
+def write_file(path, payload):
+    """
+    Writes a text file atomically via a temporary file.
+    """
+    temp_path = path + '.tmp'
+
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(payload)
+
+    os.replace(temp_path, path)
+
+
+if __name__ == '__main__':
+    compile_artifacts()
@@ -2,8 +2,56 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 import plots
+import artifacts
+import datasets
+import figure_cache
+import document_index
+import os
 import streamlit.components.v1 as components
-from streamlit_folium import folium_static
+
+
+@st.cache_resource
+def get_datasets():
+    """
+    Dataset cache shared by all sessions of the server.
+    """
+    return datasets.DatasetCache()
+
+
+@st.cache_resource
+def get_figures():
+    """
+    Figure cache shared by all sessions of the server, and on disk by all server processes.
+    """
+    return figure_cache.FigureCache(cache_dir='./.figure_cache/')
+
+
+@st.cache_resource
+def get_artifacts():
+    """
+    Figures compiled by artifacts.py, served while they match the data files.
+    """
+    return artifacts.ArtifactStore('./artifacts/')
+
+
+@st.cache_resource
+def get_document_index():
+    """
+    Document index built by analysis_entities/search_index.py, or None if it was not built.
+    """
+    index_file = './analysis_entities/documents.sqlite'
+    return document_index.DocumentIndex(index_file) if os.path.exists(index_file) else None
+
+
+def document_table(documents):
+    """
+    Markdown table (Year, Document link, Mentions) of DocumentIndex query results.
+    Documents without url are listed by file name.
+    """
+    links = [f'<a href="{url}" target="_blank">{file_name}</a>' if isinstance(url, str) and url else file_name for file_name, url in zip(documents['file_name'], documents['url'])]
+    table = pd.DataFrame({"Year": documents['year'], "Document": links, "Mentions": documents['count']})
+    return table.to_markdown(index=False)
+
 
 def main():
     st.set_page_config(
@@ -20,8 +68,12 @@ def main():
     st.write(" ")
     
     file1 = './analysis_entities/entities_timeline.csv'
-    file2 = './analysis_words/groupedfrequencies.csv'
+    file2 = './analysis_words/word_frequencies.parquet'
     file3 = './analysis_global/worldmap.csv'
+    file4 = './analysis_entities/entity_urls.csv'
+    dataset_cache = get_datasets()
+    figures = get_figures()
+    artifact_store = get_artifacts()
 
     topics = {
             "About": ["The Project", "Allen & Overy", "Our Team"],  
@@ -45,63 +97,93 @@ def main():
     # ESG Entities
     if "Proportional Frequencies" in selected_option:
         st.markdown("### ESG Entities: Proportional Frequencies")
-        fig1 = plots.timeline_bar(file1)
+        fig1 = artifact_store.plotly_figure('timeline_bar')
+        if fig1 is None:
+            fig1 = figures.plotly_figure(plots.timeline_bar, dataset_cache.load(file1), dataset_cache.version(file1))
         st.plotly_chart(fig1)
         st.markdown("---")
         st.markdown("&nbsp; ")
 
     if "Frequency & Clusters" in selected_option:
         st.markdown("### ESG Entities: Frequency & Clusters")
-        fig2 = plots.bubble_chart(file1)
+        fig2 = artifact_store.plotly_figure('bubble_chart')
+        if fig2 is None:
+            fig2 = figures.plotly_figure(plots.bubble_chart, dataset_cache.load(file1), dataset_cache.version(file1))
         st.plotly_chart(fig2)
         st.markdown("---")
         st.markdown("&nbsp; ")
         
-        urls = pd.read_csv("./analysis_entities/entity_urls.csv")
-        urls_link = urls.copy()
+        index = get_document_index()
+        if index is not None:
+            country = st.selectbox("Country:", ["All"] + index.countries())
+            country = None if country == "All" else country
+            years = st.slider("Years:", 2004, 2023, (2004, 2023))
+
+            query = st.text_input("Search documents for an entity, alias or phrase:")
+            if query:
+                documents = index.top_documents(query, top_k=10, years=years, country=country)
+                if documents.empty:
+                    st.markdown(f"No documents mention *{query}*.")
+                else:
+                    st.markdown(document_table(documents), unsafe_allow_html=True)
+
+            st.markdown("### Documents with highest frequency per entity/year combination:")
+            for entity in index.entities:
+                with st.expander(f"**Documents for {entity}**"):
+                    documents = index.best_per_year(entity, years=years, country=country)
+                    st.markdown(document_table(documents) if not documents.empty else "No documents.", unsafe_allow_html=True)
+        else:
+            urls = dataset_cache.load(file4)
+            urls_link = urls.copy()
         
-        for column in urls_link.columns:
-            urls_link[column] = urls_link[column].apply(lambda x: f'<a href="{x}" target="_blank">{x}</a>' if isinstance(x, str) and x.startswith('http') else x)
+            for column in urls_link.columns:
+                urls_link[column] = urls_link[column].apply(lambda x: f'<a href="{x}" target="_blank">{x}</a>' if isinstance(x, str) and x.startswith('http') else x)
         
-        urls_link = urls_link.where(pd.notnull(urls_link), '-')
+            urls_link = urls_link.where(pd.notnull(urls_link), '-')
         
-        entities = urls.index.tolist()
-        entity_names = urls.iloc[1:, 0].values.tolist()
+            entities = urls.index.tolist()
+            entity_names = urls.iloc[1:, 0].values.tolist()
         
-        st.markdown("### Documents with highest frequency per entity/year combination:")  
-        for entity, entity_name in zip(entities, entity_names):
-            with st.expander(f"**Documents for {entity_name}**"):
-                years = urls.columns.tolist()
-                years = years[1:]
-                data = []
+            st.markdown("### Documents with highest frequency per entity/year combination:")  
+            for entity, entity_name in zip(entities, entity_names):
+                with st.expander(f"**Documents for {entity_name}**"):
+                    years = urls.columns.tolist()
+                    years = years[1:]
+                    data = []
                 
-                for year in years:
-                    url = urls_link.loc[entity, year]
-                    data.append([year, url])
+                    for year in years:
+                        url = urls_link.loc[entity, year]
+                        data.append([year, url])
                     
-                df = pd.DataFrame(data, columns=["Year", "Document"])
-                st.markdown(df.to_markdown(index=False), unsafe_allow_html=True)        
+                    df = pd.DataFrame(data, columns=["Year", "Document"])
+                    st.markdown(df.to_markdown(index=False), unsafe_allow_html=True)        
     
     # ESG Topics
     if "Topic Analysis" in selected_option:
         st.markdown("### ESG Topics: Topic Analysis")
         year = st.selectbox("Select a year:", list(range(2013, 2024)))
-        html_string = plots.lda(year)
+        vis_data = dataset_cache.load(f'./analysis_topics/lda_vis_{year}.json.gz', reader=datasets.read_text)
+        html_string = plots.lda(vis_data)
         components.html(html_string, height=1200, width=1200)
     
     # ESG Words
     if "Word Frequencies" in selected_option:
         st.markdown("### ESG Topics: Word Frequencies")
         
-        df = pd.read_csv(file2)
-        countries = df['Country'].unique()
-        country = st.selectbox('Select country:', countries)
-        filtered_data = df[df['Country'] == country]
-        years = filtered_data['Year'].unique()
-        years = [int(year) for year in years]
+        word_index = artifact_store.word_index()
+        if word_index is None:
+            word_index = {}
+            for country, year in dataset_cache.load(file2, reader=datasets.read_word_frequencies):
+                word_index.setdefault(country, []).append(year)
+        
+        country = st.selectbox('Select country:', list(word_index))
+        years = word_index[country]
         year = st.slider('Select Year', min_value=int(min(years)), max_value=int(max(years)))
         
-        fig3 = plots.grouped_frequency(filtered_data, country, year)
+        fig3 = artifact_store.plotly_figure('grouped_frequency', country, year)
+        if fig3 is None:
+            word_frequencies = dataset_cache.load(file2, reader=datasets.read_word_frequencies)
+            fig3 = figures.plotly_figure(plots.grouped_frequency, word_frequencies, dataset_cache.version(file2), country, year)
         st.plotly_chart(fig3)
         
         st.markdown("---")
@@ -110,8 +192,10 @@ def main():
     # ESG Global Map
     if "Global Map" in selected_option:
         st.markdown("### ESG Topics: Global Map")
-        fig4 = plots.world_map(file3)
-        folium_static(fig4, width=1200)
+        map_html = artifact_store.map_html('world_map')
+        if map_html is None:
+            map_html = figures.map_html(plots.world_map, dataset_cache.load(file3), dataset_cache.version(file3))
+        components.html(map_html, width=1200, height=700)
         st.markdown("---")
         st.markdown("&nbsp; ")
         
@@ -0,0 +1,174 @@
+"""
+Loading and caching of the dashboard data files.
+"""
+import gzip
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+class DatasetCache:
+    """
+    Keeps parsed data files in memory across reruns and sessions.
+
+    A cached entry is reused as long as its file is unchanged: the mtime and size are checked
+    at most once every check_interval seconds, and when they changed the content hash decides
+    whether the file is parsed again. When the cached data exceeds max_bytes, the least recently
+    used entries are evicted. Hits, misses and evictions are counted, see stats().
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20, check_interval=2.0):
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self.entries = OrderedDict()
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self, path, reader=pd.read_csv):
+        """
+        Returns reader(path), parsed once and cached until the file changes.
+        The same file can be cached with different readers. Callers must not modify the result.
+        """
+        key = (os.path.abspath(path), reader)
+
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None and self.is_current(path, entry):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry['data']
+
+            self.misses += 1
+            stat = file_stat(path)
+            version = file_hash(path)
+            data = reader(path)
+
+            self.entries[key] = {
+                'data': data,
+                'stat': stat,
+                'version': version,
+                'checked': time.monotonic(),
+                'bytes': data_size(data),
+            }
+            self.entries.move_to_end(key)
+            self.evict()
+
+            return data
+
+    def is_current(self, path, entry):
+        """
+        Checks whether a cached entry still matches its file.
+        """
+        now = time.monotonic()
+        if now - entry['checked'] < self.check_interval:
+            return True
+
+        entry['checked'] = now
+        stat = file_stat(path)
+        if stat == entry['stat']:
+            return True
+
+        # Touched but not changed (e.g. a rewrite with the same content)
+        if file_hash(path) == entry['version']:
+            entry['stat'] = stat
+            return True
+
+        return False
+
+    def version(self, path):
+        """
+        Returns the content hash of a data file, shared by all readers of that file.
+        Used to key derived results such as figures.
+        """
+        path = os.path.abspath(path)
+
+        with self.lock:
+            for (entry_path, _), entry in self.entries.items():
+                if entry_path == path and self.is_current(path, entry):
+                    return entry['version']
+
+        return file_hash(path)
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_bytes.
+        The most recent entry is always kept.
+        """
+        while len(self.entries) > 1 and sum(entry['bytes'] for entry in self.entries.values()) > self.max_bytes:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the current size of the cache.
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': sum(entry['bytes'] for entry in self.entries.values()),
+            }
+
+
+def read_text(path):
+    """
+    Reads a (gzip-compressed, if the name ends with .gz) text file.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return f.read()
+
+
+def read_word_frequencies(path):
+    """
+    Reads the word frequency table (see /analysis_words/wordfrequencies.py) into a dictionary
+    (country, year) -> DataFrame with the word and count columns, ordered by rank.
+    """
+    table = pd.read_parquet(path)
+
+    return {(str(country), int(year)): group.reset_index(drop=True) for (country, year), group in table.groupby(level=['country', 'year'], sort=False, observed=True)}
+
+
+def file_stat(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_hash(path):
+    """
+    Computes the SHA-256 hash of a file.
+    """
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def data_size(data):
+    """
+    Estimates the memory used by cached data (DataFrames, dictionaries of them, strings).
+    """
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(deep=True).sum())
+    if isinstance(data, pd.Series):
+        return int(data.memory_usage(deep=True))
+    if isinstance(data, dict):
+        return sum(data_size(value) for value in data.values())
+    if isinstance(data, (str, bytes)):
+        return len(data)
+
+    return sys.getsizeof(data)
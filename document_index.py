@@ -0,0 +1,169 @@
+"""
+Queries on the document index built by /analysis_entities/search_index.py.
+"""
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from analysis_entities.aliases import AliasMatcher
+
+
+class DocumentIndex:
+    """
+    Finds the documents that mention an entity most, optionally within a year range and country.
+
+    Entities of entity_vars (ner.py) and their aliases (resolved with AliasMatcher, ignoring case) are looked
+    up in the mention counts computed when the index was built. Any other phrase is counted with the full-text
+    index: the term positions (positions table) of only the documents that contain the phrase are matched.
+    Full-text matching ignores case and punctuation. Query results are kept in memory, see max_results.
+    """
+
+    def __init__(self, index_file, max_results=1024):
+        self.connection = sqlite3.connect(f"file:{index_file}?mode=ro", uri=True, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.max_results = max_results
+        self.results = {}
+        # Entities of entity_vars, most mentioned first
+        self.entities = [entity for entity, in self.execute("SELECT entity FROM mentions GROUP BY entity ORDER BY SUM(count) DESC, entity")]
+        aliases = defaultdict(list)
+        for alias, entity in self.execute("SELECT alias, entity FROM aliases"):
+            aliases[entity].append(alias)
+        self.matcher = AliasMatcher(aliases, case_sensitive=False)
+        self.metadata = pd.DataFrame(self.execute("SELECT id, year, country, file_name, url FROM documents"), columns=['id', 'year', 'country', 'file_name', 'url']).set_index('id')
+
+    def execute(self, query, parameters=()):
+        with self.lock:
+            return self.connection.execute(query, parameters).fetchall()
+
+    def counts(self, query, years=None, country=None):
+        """
+        Counts the mentions of an entity or phrase per document.
+        years is an inclusive (first, last) range. Returns dictionary document id -> count.
+        """
+        key = (query, years, country)
+        if key in self.results:
+            return self.results[key]
+
+        filters, parameters = document_filter(years, country)
+        entity = self.entity(query)
+
+        if entity is not None:
+            rows = self.execute(f"SELECT doc, count FROM mentions JOIN documents ON documents.id = mentions.doc WHERE entity = ?{filters}", [entity] + parameters)
+            counts = dict(rows)
+        else:
+            counts = self.phrase_counts(terms(query), filters, parameters)
+
+        if len(self.results) >= self.max_results:
+            self.results.pop(next(iter(self.results)))
+        self.results[key] = counts
+
+        return counts
+
+    def entity(self, query):
+        """
+        Returns the entity that query names (the entity itself or one of its aliases), or None.
+        """
+        query = ' '.join(query.split())
+        matches = list(self.matcher.finditer(query))
+
+        if len(matches) == 1 and matches[0][:2] == (0, len(query)) and len(matches[0][2]) == 1:
+            return next(iter(matches[0][2]))
+
+        return None
+
+    def phrase_counts(self, phrase, filters, parameters):
+        """
+        Counts the occurrences of a phrase (list of terms) in the documents that match it and the filters.
+        """
+        if not phrase:
+            return {}
+
+        # The term positions are only read for the documents that contain the phrase
+        match = '"' + ' '.join(phrase) + '"'
+        unique_terms = list(dict.fromkeys(phrase))
+        rows = self.execute(f"""
+            SELECT positions.doc, positions.term, positions.offsets FROM documents_fts
+            JOIN documents ON documents.id = documents_fts.rowid
+            JOIN positions ON positions.doc = documents_fts.rowid
+            WHERE documents_fts MATCH ?{filters} AND positions.term IN ({','.join('?' * len(unique_terms))})
+        """, [match] + parameters + unique_terms)
+
+        offsets = defaultdict(dict)
+        for doc, term, packed in rows:
+            offsets[doc][term] = np.frombuffer(packed, dtype='<i4')
+
+        # Start offsets of the phrase: offsets of term i, minus i, that are present for every term
+        counts = {}
+        for doc, term_offsets in offsets.items():
+            starts = term_offsets.get(phrase[0], np.empty(0, dtype='<i4'))
+            for i, term in enumerate(phrase[1:], start=1):
+                starts = np.intersect1d(starts, term_offsets.get(term, np.empty(0, dtype='<i4')) - i, assume_unique=True)
+
+            if len(starts):
+                counts[doc] = len(starts)
+
+        return counts
+
+    def top_documents(self, query, top_k=10, years=None, country=None):
+        """
+        Returns DataFrame (year, country, file_name, url, count) of the top_k documents, most mentions first.
+        """
+        counts = self.counts(query, years, country)
+        best = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+        return self.documents(best)
+
+    def best_per_year(self, query, years=None, country=None):
+        """
+        Returns DataFrame (year, country, file_name, url, count) with the document with most mentions of every year.
+        Ties go to the first document of the year.
+        """
+        counts = self.counts(query, years, country)
+        documents = self.documents(sorted(counts.items()))
+
+        if documents.empty:
+            return documents
+
+        documents = documents.sort_values(['year', 'count'], ascending=[True, False], kind='stable')
+        return documents.drop_duplicates('year').reset_index(drop=True)
+
+    def documents(self, counts):
+        """
+        Looks up the metadata of (document id, count) pairs, keeping their order.
+        """
+        ids = [doc for doc, _ in counts]
+
+        return self.metadata.loc[ids].assign(count=[count for _, count in counts]).reset_index(drop=True)
+
+    def countries(self):
+        return sorted(self.metadata['country'].dropna().unique())
+
+
+def terms(text):
+    """
+    Splits text into the terms of the full-text index (unicode61 tokenizer: lowercase letters and digits, no diacritics).
+    """
+    text = ''.join(character for character in unicodedata.normalize('NFKD', text.lower()) if not unicodedata.combining(character))
+
+    return re.findall(r'[^\W_]+', text)
+
+
+def document_filter(years=None, country=None):
+    """
+    Builds the SQL conditions (on the documents table) for a year range and country.
+    """
+    filters, parameters = '', []
+
+    if years is not None:
+        filters += " AND documents.year BETWEEN ? AND ?"
+        parameters += [int(years[0]), int(years[1])]
+    if country is not None:
+        filters += " AND documents.country = ?"
+        parameters.append(country)
+
+    return filters, parameters
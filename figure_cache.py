@@ -0,0 +1,174 @@
+"""
+Caching of the dashboard figures built by plots.py.
+"""
+import hashlib
+import inspect
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+
+class FigureCache:
+    """
+    Keeps serialized figures: Plotly figure JSON, or the rendered HTML of folium maps.
+
+    Entries are keyed by builder, the code version of its module (see code_version()), parameters
+    and the version (content hash) of the source data, so a figure is rebuilt only when one of those
+    changes. The memory tier is an LRU bounded by max_bytes. With cache_dir set, figures are also
+    written to disk, where every server process can read them; the disk tier is pruned (oldest
+    first) to max_disk_bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 2 ** 20, cache_dir=None, max_disk_bytes=512 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def plotly_figure(self, builder, data, version, *params):
+        """
+        Returns builder(data, *params) as Plotly figure, built once per (builder, params, version).
+        """
+        payload = self.payload(builder, data, version, params, 'json', lambda figure: figure.to_json())
+        return pio.from_json(payload)
+
+    def map_html(self, builder, data, version, *params):
+        """
+        Returns the rendered HTML of the folium map builder(data, *params).
+        """
+        return self.payload(builder, data, version, params, 'html', lambda figure: figure.get_root().render())
+
+    def payload(self, builder, data, version, params, extension, serialize):
+        key = (builder.__module__, builder.__name__, code_version(builder), params, version)
+        key = hashlib.sha256(repr(key).encode()).hexdigest() + '.' + extension
+
+        payload = self.get(key)
+        if payload is None:
+            payload = serialize(builder(data, *params))
+            self.put(key, payload)
+
+        return payload
+
+    def get(self, key):
+        """
+        Looks up a payload in memory, then on disk. Returns None when it is not cached.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    payload = f.read()
+            except FileNotFoundError:
+                pass
+            else:
+                # Marks the file as recently used, unless another process pruned it meanwhile
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    pass
+                self.disk_hits += 1
+                self.remember(key, payload)
+                return payload
+
+        self.misses += 1
+        return None
+
+    def put(self, key, payload):
+        """
+        Stores a payload in memory and, if enabled, on disk (atomically, via a temporary file).
+        """
+        self.remember(key, payload)
+
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, key)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+
+            os.replace(temp_path, path)
+            self.prune_disk()
+
+    def remember(self, key, payload):
+        """
+        Adds a payload to the memory tier and evicts least recently used entries over max_bytes.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+
+            self.entries[key] = payload
+            self.size += len(payload)
+
+            while len(self.entries) > 1 and self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def prune_disk(self):
+        """
+        Removes the least recently used files of the disk tier until it fits in max_disk_bytes.
+        """
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.tmp'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in files)
+
+        for _, size, name in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        """
+        Returns the hit/miss counters and the size of the memory tier.
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self.entries),
+                'bytes': self.size,
+            }
+
+
+code_versions = {}
+
+
+def code_version(function):
+    """
+    Returns the hash of the source code of a module, or of the module that defines a function.
+    The whole module is hashed, because builders depend on the helpers next to them.
+    """
+    module = inspect.getmodule(function)
+
+    if module.__name__ not in code_versions:
+        code_versions[module.__name__] = hashlib.sha256(inspect.getsource(module).encode()).hexdigest()
+
+    return code_versions[module.__name__]
@@ -1,15 +1,15 @@
 import csv
-from collections import defaultdict
+import logging
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.express as px
 import streamlit as st
-import ast
 import folium
-from folium.plugins import MarkerCluster
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
+from folium.plugins import FastMarkerCluster
+
+logger = logging.getLogger(__name__)
 
 entity_names = {
     'EPA': 'Environmental Protection Agency',
@@ -48,157 +48,143 @@ entity_classes = {
     }
 
 
-def timeline_bar(csv_file):
-    df = pd.read_csv(csv_file)
-    fig = go.Figure()
-    color = 'rgb(178, 52, 39, 95)'
-    totals = []
-    
-    for i, year in enumerate(df.columns[1:]):
-        total = df[year].sum()
-        totals.append(total)
-        proportions = df[year] / total
-
-        hovertext = []
-        for entity, proportion in zip(df['Entity'], proportions):
-            full_name = entity_names.get(entity, entity)
-            hover_info = f'<b>{full_name}</b></br>Proportion: {proportion:.2f}<br>Year: {year}'
-            hovertext.append(hover_info)
-
-        fig.add_trace(go.Bar(
-            x=proportions,
-            y=df['Entity'],
-            name=str(year),
-            orientation='h',
-            marker_color=color,
-            hovertemplate="%{hovertext}<extra></extra>",
-            hovertext=hovertext,
-            ),
-        )
+def timeline_bar(df, max_bytes=2 * 2 ** 20):
+    # One bar trace, the year slider swaps its x values and hover text (instead of one trace per year)
+    years = [str(year) for year in df.columns[1:]]
+    entities = df['Entity'].tolist()
+    counts = df[df.columns[1:]].to_numpy(dtype=float)
+    totals = counts.sum(axis=0)
+    proportions = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0).round(4)
+    full_names = [entity_names.get(entity, entity) for entity in entities]
+
+    def hovertemplate(year):
+        return '<b>%{customdata}</b></br>Proportion: %{x:.2f}<br>Year: ' + year + '<extra></extra>'
 
-    y_axis_range = [-0.5, len(df['Entity']) - 0.5]
+    def title(i):
+        return "<b>Entity Proportional Frequencies for " + years[i] + " (total: " + str(int(totals[i])) + ")</b>"
+
+    fig = go.Figure(go.Bar(
+        x=proportions[:, 0],
+        y=entities,
+        orientation='h',
+        marker_color='rgb(178, 52, 39, 95)',
+        customdata=full_names,
+        hovertemplate=hovertemplate(years[0]),
+    ))
+
+    steps = [
+        dict(
+            method="update",
+            args=[
+                {"x": [proportions[:, i]], "hovertemplate": [hovertemplate(year)]},
+                {"title.text": title(i)},
+            ],
+            value=year,
+            label=year,
+        )
+        for i, year in enumerate(years)
+    ]
 
     slider = dict(
         active=0,
         currentvalue={"prefix": "<b>Year:</b> "},
         pad={"t": 50},
-        steps=[],
+        steps=steps,
         font=dict(size=12)
     )
 
-    for i, year in enumerate(df.columns[1:]):
-        fig.update_traces(selector=dict(name=str(year)))
-        total_frequency = totals[i]
-        
-        step = dict(
-            method="update",
-            args=[
-                {"visible": [year == col for col in df.columns[1:]]},
-                {"title.text": "<b>Entity Proportional Frequencies for "+str(year)+" (total: "+str(total_frequency)+")</b>"}
-            ],
-            value=str(year),
-            label=str(year)
-        )
-        slider['steps'].append(step)
-
     fig.update_layout(
-        barmode='group',
+        title_text=title(0),
         sliders=[slider],
         height=1000,
         width=1200,
         margin=dict(l=100, r=100, t=100, b=100),
-        yaxis=dict(range=y_axis_range, title="<b>Name of Entity</b>", ticksuffix="    ", tickmode='array', tick0=1, dtick=1, title_font=dict(size=20), tickfont=dict(size=16), automargin=True),
+        yaxis=dict(range=[-0.5, len(entities) - 0.5], title="<b>Name of Entity</b>", ticksuffix="    ", tickmode='array', tick0=1, dtick=1, title_font=dict(size=20), tickfont=dict(size=16), automargin=True),
         xaxis=dict(range=[0,1], title="<b>Proportional Frequency</b>", title_font=dict(size=18), tickfont=dict(size=20)),
     )
+
+    reduced = downsample(fig, df, max_bytes)
+    if reduced is not None:
+        return timeline_bar(reduced, max_bytes)
+
     return fig
 
 
-def bubble_chart(csv_file):
-    df = pd.read_csv(csv_file)
-    frequencies = defaultdict(dict)
+def figure_size(fig):
+    """
+    Returns the size in bytes of the figure as serialized for the browser.
+    """
+    return len(fig.to_json().encode())
 
-    for _, row in df.iterrows():
-        entity = row['Entity']
-        for year in df.columns[1:]:
-            if int(year) < 2004:
-                continue
-            else:
-                frequencies[year][entity] = row[year]
 
-    data = []
-    legend_labels = list(set(entity_classes.values()))
+def downsample(fig, df, max_bytes):
+    """
+    Checks a figure of the entity table df (Entity column, one column per year) against max_bytes.
+    Returns None when it fits, otherwise df with only the most frequent half of its entities (in their
+    original order), to build a smaller figure from. Logs a warning instead of failing the view.
+    """
+    size = figure_size(fig)
+    if max_bytes is None or size <= max_bytes:
+        return None
+
+    if len(df) <= 1:
+        logger.warning("Figure is %d bytes, more than the maximum of %d bytes", size, max_bytes)
+        return None
+
+    totals = df[df.columns[1:]].sum(axis=1)
+    keep = totals.sort_values(ascending=False, kind='stable').index[:len(df) // 2]
+    logger.warning("Figure is %d bytes, more than the maximum of %d bytes: showing the %d most frequent of %d entities", size, max_bytes, len(keep), len(df))
+
+    return df[df.index.isin(keep)]
+
+
+def bubble_chart(df, max_bytes=2 * 2 ** 20):
     class_colors = {
         'Regulatory Authority': 'green',
         'Corporate': 'red',
         'NGO': 'blue',
-        'Politics': 'yellow'
+        'Politics': 'yellow',
+        'Other': 'gray',
     }
-    
 
-    for year in frequencies:
-        entities = []
-        frequencies_year = []
-        sizes = []
-        color_values = []
-
-        for entity in frequencies[year]:
-            entities.append(entity)
-            frequencies_year.append(frequencies[year][entity])
-            sizes.append(frequencies[year][entity])
-            
-            entity_class = entity_classes.get(entity)
-            if entity_class in class_colors:
-                color_values.append(class_colors[entity_class])
-        
-        hovertext = []
-        for i, entity in enumerate(entities):
-            full_name = entity_names.get(entity, entity)
-            hover_info = f'<b>{full_name}</b><br>Frequency: {frequencies_year[i]}<br>Year: {year}'
-            hovertext.append(hover_info)
-        
+    # Long form: one row per (entity, year) bubble, from 2004 on
+    years = [year for year in df.columns[1:] if int(year) >= 2004]
+    bubbles = df.melt(id_vars='Entity', value_vars=years, var_name='Year', value_name='Frequency')
+    # Entities without a class in entity_classes are shown as Other, not dropped
+    bubbles['Class'] = bubbles['Entity'].map(entity_classes).fillna('Other')
+    bubbles['Name'] = bubbles['Entity'].map(lambda entity: entity_names.get(entity, entity))
+
+    # One trace per entity class, which is also its legend entry
+    data = []
+    for label, color in class_colors.items():
+        group = bubbles[bubbles['Class'] == label]
+        if group.empty:
+            continue
+
         data.append(
             go.Scatter(
-                x=[year] * len(entities),
-                y=entities,
+                x=group['Year'],
+                y=group['Entity'],
                 mode='markers',
                 marker=dict(
-                    size=sizes,
+                    size=group['Frequency'],
                     sizemode='diameter',
                     sizeref=350,
-                    color=color_values,
+                    color=color,
                     opacity=0.5,
                     showscale=False,
                 ),
-                hovertemplate="%{hovertext}<extra></extra>",
-                hovertext=hovertext,
-                legendgroup='Entity Classes',
-                showlegend=False,
-                text=[entity_names.get(entity, entity) for entity in entities],
+                customdata=group['Name'],
+                hovertemplate="<b>%{customdata}</b><br>Frequency: %{marker.size}<br>Year: %{x}<extra></extra>",
+                name=label,
+                legendgroup=label,
+                showlegend=True,
             )
         )
 
-    legend_traces = []
-    
-    for label in legend_labels:
-        color = class_colors[label]
-        legend_trace = go.Scatter(
-            x=[None],
-            y=[None],
-            mode='markers',
-            marker=dict(size=10, color=color),
-            showlegend=True,
-            legendgroup=label,
-            hoverinfo='none',
-            name=label,
-            opacity=0.5
-        )
-        legend_traces.append(legend_trace)
-   
-    data += legend_traces
-
     layout = go.Layout(
         xaxis=dict(title="<b>Year<b>", title_font=dict(size=20)),
-        yaxis=dict(title="<b>Name of Entity<b>", type='category', ticksuffix="   ", title_font=dict(size=20)),
+        yaxis=dict(title="<b>Name of Entity<b>", type='category', categoryorder='array', categoryarray=df['Entity'].tolist(), ticksuffix="   ", title_font=dict(size=20)),
         height=1000,
         width=1200,
         margin=dict(l=100, r=100, t=100, b=100),
@@ -223,32 +209,47 @@ def bubble_chart(csv_file):
         margin=dict(l=100, r=100, t=100, pad=10),
     )
 
-    for trace in data[:-len(legend_traces)]:
-        fig.add_trace(trace)
-    
-    
+    reduced = downsample(fig, df, max_bytes)
+    if reduced is not None:
+        return bubble_chart(reduced, max_bytes)
+
     return fig
 
-def lda(year):
-    with open(f'./analysis_topics/lda_vis_{year}.0.html', 'r') as f:
-        html_string = f.read()
-        
-    return html_string
+# Shared LDAvis page, the visualization data of a year is inserted as JSON
+lda_template = """
+<link rel="stylesheet" type="text/css" href="https://cdn.jsdelivr.net/gh/bmabey/pyLDAvis@3.4.0/pyLDAvis/js/ldavis.v1.0.0.css">
+<div id="ldavis" style="background-color:white;"></div>
+<script type="text/javascript">
+var ldavis_data = %s;
+
+function LDAvis_load_lib(url, callback){
+  var s = document.createElement('script');
+  s.src = url;
+  s.async = true;
+  s.onreadystatechange = s.onload = callback;
+  s.onerror = function(){console.warn("failed to load library " + url);};
+  document.getElementsByTagName("head")[0].appendChild(s);
+}
 
+LDAvis_load_lib("https://d3js.org/d3.v5.js", function(){
+  LDAvis_load_lib("https://cdn.jsdelivr.net/gh/bmabey/pyLDAvis@3.4.0/pyLDAvis/js/ldavis.v3.0.0.js", function(){
+    new LDAvis("#ldavis", ldavis_data);
+  });
+});
+</script>
+"""
 
-def grouped_frequency(data_frame, country, year):
-    filtered_data = data_frame[(data_frame['Country'] == country) & (data_frame['Year'] == year)]
-    frequencies = []
-    words = []
 
-    for freq_list in filtered_data['Frequency']:
-        if isinstance(freq_list, str):
-            freq_list = ast.literal_eval(freq_list)
-        
-        if isinstance(freq_list, list) and len(freq_list) > 0 and isinstance(freq_list[0], tuple) and len(freq_list[0]) == 2:
-            freq, word = zip(*freq_list)
-            frequencies.extend(freq)
-            words.extend(word)
+def lda(vis_data):
+    # vis_data: JSON text of a year, see datasets.read_text() and /analysis_topics/topics.py
+    return lda_template % vis_data
+
+
+def grouped_frequency(word_frequencies, country, year):
+    # word_frequencies: dictionary (country, year) -> DataFrame, see datasets.read_word_frequencies()
+    group = word_frequencies.get((country, year))
+    words = [] if group is None else group['word'].tolist()
+    frequencies = [] if group is None else group['count'].tolist()
 
     if len(words) == 0:
         fig = go.Figure()
@@ -262,8 +263,8 @@ def grouped_frequency(data_frame, country, year):
     else:
         fig = go.Figure(
             data=go.Bar(
-                x=words, 
-                y=frequencies, 
+                x=frequencies, 
+                y=words, 
                 orientation='h'
             )
         )
@@ -283,26 +284,74 @@ def grouped_frequency(data_frame, country, year):
 
     return fig
 
-def world_map(csv_file):
-    df = pd.read_csv(csv_file)
-
-    # empty map
-    world_map= folium.Map(tiles="cartodbpositron")
-    marker_cluster = MarkerCluster().add_to(world_map)
-
-    # for each coordinate, create circlemarker of user percent
-    for i in range(len(df)):
-            lat = df.iloc[i]['latitude']
-            long = df.iloc[i]['longitude']
-            radius=5
-            popup_text = """Country : {}<br>
-                        ESG-term : {}<br>
-                        Link : {}<br"""
-            popup_text = popup_text.format(df.iloc[i]['country'],
-                                    df.iloc[i]['ESG-term'],
-                                        df.iloc[i]['link']
-                                    )
-            folium.CircleMarker(location = [lat, long], radius=radius, popup= popup_text, fill =True).add_to(marker_cluster)
-    
-    # show the map
+def world_map(df, max_markers=5000, grid_size=1.0, max_cells=2000, max_links=5):
+    """
+    Maps the cases of worldmap.csv. Up to max_markers cases are drawn as individual markers, clustered
+    in the browser. Larger case lists are aggregated on the server into grid cells of (at least) grid_size
+    degrees, drawn as one GeoJSON layer with a marker per cell, so the HTML size stays bounded.
+    """
+    world_map = folium.Map(tiles="cartodbpositron")
+
+    # Cases of countries without coordinates (see analysis_global/geocode.py) cannot be placed
+    df = df.dropna(subset=['latitude', 'longitude'])
+
+    if len(df) <= max_markers:
+        popups = 'Country : ' + df['country'].astype(str) + '<br>ESG-term : ' + df['ESG-term'].astype(str) + '<br>Link : ' + df['link'].astype(str) + '<br>'
+        points = list(zip(df['latitude'].tolist(), df['longitude'].tolist(), popups.tolist()))
+        FastMarkerCluster(points, callback=case_marker).add_to(world_map)
+    else:
+        folium.GeoJson(
+            grid_clusters(df, grid_size, max_cells, max_links),
+            marker=folium.CircleMarker(fill=True),
+            style_function=lambda feature: {'radius': feature['properties']['radius']},
+            popup=folium.GeoJsonPopup(fields=['popup'], labels=False),
+        ).add_to(world_map)
+
     return world_map
+
+
+# Draws one case of FastMarkerCluster data [latitude, longitude, popup]
+case_marker = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {radius: 5, fill: true});
+    marker.bindPopup(row[2]);
+    return marker;
+}
+"""
+
+
+def grid_clusters(df, grid_size=1.0, max_cells=2000, max_links=5):
+    """
+    Aggregates the cases into grid cells of grid_size degrees, doubled until there are at most max_cells.
+    Returns a GeoJSON FeatureCollection with one point (at the mean position of its cases) per cell.
+    Cells whose cases have no ESG-term (or country, link) get an empty entry in the popup.
+    """
+    cases = df.dropna(subset=['latitude', 'longitude'])
+
+    while True:
+        cell = list(zip(np.floor(cases['latitude'] / grid_size), np.floor(cases['longitude'] / grid_size)))
+        cases = cases.assign(cell=pd.factorize(pd.Series(cell, index=cases.index))[0])
+        if cases['cell'].nunique() <= max_cells:
+            break
+        grid_size *= 2
+
+    cells = cases.groupby('cell', sort=False)
+    summary = cells.agg(count=('link', 'size'), latitude=('latitude', 'mean'), longitude=('longitude', 'mean'))
+
+    countries = cases.drop_duplicates(['cell', 'country']).groupby('cell')['country'].agg(lambda values: ', '.join(values.astype(str).head(3)))
+    terms = cases.groupby(['cell', 'ESG-term']).size().sort_values(ascending=False).groupby(level='cell').head(3).reset_index().groupby('cell')['ESG-term'].agg(', '.join)
+    links = cells.head(max_links).groupby('cell')['link'].agg(lambda values: '<br>'.join(values.astype(str)))
+
+    features = []
+    for cell_id, count, latitude, longitude in zip(summary.index, summary['count'], summary['latitude'], summary['longitude']):
+        features.append({
+            'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [float(longitude), float(latitude)]},
+            'properties': {
+                'count': int(count),
+                'radius': float(min(30, 5 + 2 * np.sqrt(count - 1))),
+                'popup': f"Country : {countries.get(cell_id, '')}<br>Cases : {count}<br>ESG-terms : {terms.get(cell_id, '')}<br>Links :<br>{links.get(cell_id, '')}",
+            },
+        })
+
+    return {'type': 'FeatureCollection', 'features': features}
@@ -0,0 +1,160 @@
+"""
+Code used to find near-duplicate documents in DATA_FOLDER/<year>/*.txt.
+The same filing is often attached to several cases, and exhibits are re-filed.
+Documents are compared with MinHash signatures over word shingles, candidate pairs are found with
+locality sensitive hashing (LSH) and near-identical documents are clustered.
+Per cluster the first document (by year, then file name) is kept as the canonical copy.
+
+Output is saved to DATA_FOLDER/duplicates.csv (document, canonical, similarity), listing every
+non-canonical document. preprocess(), rank_year() and the word frequencies skip these documents.
+"""
+import csv
+import itertools
+import os
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def find_duplicates(data_folder='../data/', output_file='../data/duplicates.csv', threshold=0.9, num_perm=128, bands=32, shingle_size=5, processes=None):
+    """
+    Clusters documents whose estimated Jaccard similarity of word shingles is at least threshold.
+    num_perm must be divisible by bands, more bands find more candidate pairs at lower similarity.
+    Returns dictionary document -> (canonical document, similarity) for all non-canonical documents.
+    """
+    documents = []
+
+    for year in sorted(os.listdir(data_folder)):
+        year_folder = os.path.join(data_folder, year)
+        if os.path.isdir(year_folder):
+            for file_name in sorted(os.listdir(year_folder)):
+                if file_name.endswith('.txt'):
+                    documents.append(f"{year}/{file_name}")
+
+    paths = [os.path.join(data_folder, document) for document in documents]
+    permutations = make_permutations(num_perm)
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        signatures = list(executor.map(minhash, paths, [permutations] * len(paths), [shingle_size] * len(paths), chunksize=16))
+
+    # LSH: documents that agree on all rows of at least one band become candidate pairs
+    rows = num_perm // bands
+    buckets = defaultdict(list)
+    for index, signature in enumerate(signatures):
+        if signature is not None:
+            for band in range(bands):
+                buckets[(band, signature[band * rows:(band + 1) * rows].tobytes())].append(index)
+
+    parents = list(range(len(documents)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    # Every pair of bucket members is a candidate, pairs shared by several buckets are compared once
+    checked = set()
+    for members in buckets.values():
+        for pair in itertools.combinations(members, 2):
+            if pair not in checked:
+                checked.add(pair)
+                if similarity(signatures[pair[0]], signatures[pair[1]]) >= threshold:
+                    # Union towards the smaller index, which is the earlier document
+                    first, second = sorted((find(pair[0]), find(pair[1])))
+                    parents[second] = first
+
+    duplicates = {}
+    for index, document in enumerate(documents):
+        canonical = find(index)
+        if canonical != index:
+            duplicates[document] = (documents[canonical], similarity(signatures[index], signatures[canonical]))
+
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['document', 'canonical', 'similarity'])
+        for document, (canonical, score) in duplicates.items():
+            writer.writerow([document, canonical, f"{score:.3f}"])
+
+    print(f"{len(duplicates)} of {len(documents)} documents are near-duplicates, saved to {output_file}")
+
+    return duplicates
+
+
+def make_permutations(num_perm, seed=1):
+    """
+    Draws the parameters (a, b) of num_perm random hash functions h(x) = (a * x + b) mod p.
+    """
+    generator = np.random.RandomState(seed)
+    a = generator.randint(1, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    b = generator.randint(0, int(MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+
+    return a, b
+
+
+def minhash(path, permutations, shingle_size, block_size=1 << 20, batch_size=10000):
+    """
+    Computes the MinHash signature of the lowercased word shingles of one document.
+    The file is read in blocks of block_size characters. The last shingle_size - 1 words of a block
+    (and a word cut at its end) are carried over to the next block, so the shingles are the same as
+    for the whole text while memory stays bounded by the block size.
+    Returns None for documents without words.
+    """
+    a, b = permutations
+    signature = np.full(len(a), MAX_HASH, dtype=np.uint64)
+    carry, partial, n_tokens = [], '', 0
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for block in iter(lambda: f.read(block_size), ''):
+            text = partial + block.lower()
+            tokens = text.split()
+
+            # A word at the end of the block may continue in the next block
+            partial = tokens.pop() if tokens and not text[-1].isspace() else ''
+            n_tokens += len(tokens)
+
+            tokens = carry + tokens
+            update_signature(signature, [' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)], a, b, batch_size)
+            carry = tokens[max(0, len(tokens) - shingle_size + 1):]
+
+    tokens = carry + ([partial] if partial else [])
+    n_tokens += bool(partial)
+
+    if not n_tokens:
+        return None
+
+    # Documents shorter than one shingle are a single shingle
+    shingles = [' '.join(tokens)] if n_tokens < shingle_size else [' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+    update_signature(signature, shingles, a, b, batch_size)
+
+    return signature
+
+
+def update_signature(signature, shingles, a, b, batch_size=10000):
+    """
+    Lowers the signature to the minimum hash values of the shingles, hashed in batches.
+    """
+    for start in range(0, len(shingles), batch_size):
+        hashes = np.array([zlib.crc32(shingle.encode()) for shingle in shingles[start:start + batch_size]], dtype=np.uint64)
+
+        # Overflow in a * x wraps around, which is fine for hashing
+        with np.errstate(over='ignore'):
+            values = (np.outer(hashes, a) + b) % MERSENNE_PRIME & MAX_HASH
+
+        np.minimum(signature, values.min(axis=0), out=signature)
+
+
+def similarity(first, second):
+    """
+    Estimates the Jaccard similarity of two documents from their signatures.
+    """
+    return float(np.mean(first == second))
+
+
+if __name__ == '__main__':
+    find_duplicates()
@@ -0,0 +1,138 @@
+"""
+Code used to convert the scraped pdfs to text.
+Reads PDF_FOLDER/<year>/<name>.pdf (see scraper.py) and writes DATA_FOLDER/<year>/<name>.txt,
+the input of the analysis in /analysis_entities and /analysis_words.
+
+Files are converted in a process pool. Every output is written atomically, and a manifest records
+the source hash, timing and errors per file, so unchanged pdfs are skipped on the next run.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from pdfminer.high_level import extract_text
+
+
+def extract(pdf_folder='../pdfs/', data_folder='../data/', manifest_file='./extract_manifest.json', processes=None, checkpoint_every=50):
+    """
+    Converts all pdfs that are new, changed or failed before.
+    The manifest is saved every `checkpoint_every` files, so an interrupted run can be restarted.
+    Returns the manifest: dictionary source path -> {hash, output, seconds, error}.
+    """
+    manifest = load_manifest(manifest_file)
+    jobs = []
+
+    for year in sorted(os.listdir(pdf_folder)):
+        year_folder = os.path.join(pdf_folder, year)
+        if not os.path.isdir(year_folder):
+            continue
+
+        for file_name in sorted(os.listdir(year_folder)):
+            if file_name.lower().endswith('.pdf'):
+                source = os.path.join(year_folder, file_name)
+                output = os.path.join(data_folder, year, os.path.splitext(file_name)[0] + '.txt')
+                jobs.append((source, output, manifest.get(source, {})))
+
+    start = time.perf_counter()
+    converted = skipped = failed = 0
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(extract_pdf, source, output, entry) for source, output, entry in jobs]
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            source, entry, status = future.result()
+            manifest[source] = entry
+
+            if status == 'skipped':
+                skipped += 1
+            elif status == 'failed':
+                failed += 1
+                print(f"Error occurred in processing of the file: {source} ({entry['error']})")
+            else:
+                converted += 1
+
+            if done % checkpoint_every == 0:
+                save_manifest(manifest_file, manifest)
+                print(f"\r{done} / {len(jobs)} processed", end='', flush=True)
+
+    save_manifest(manifest_file, manifest)
+
+    elapsed = time.perf_counter() - start
+    print(f"\r{converted} converted, {skipped} unchanged, {failed} failed in {elapsed:.1f}s")
+
+    return manifest
+
+
+def extract_pdf(source, output, entry):
+    """
+    Converts one pdf to text, unless its hash equals the hash in its manifest entry
+    and the output exists. The text is written to a temporary file and renamed when complete.
+    Returns (source, new manifest entry, status) with status 'skipped', 'converted' or 'failed'.
+    Unreadable pdfs fail like pdfs that cannot be converted, with the error in the manifest entry.
+    """
+    start = time.perf_counter()
+    new_entry = {'hash': None, 'output': output, 'seconds': None, 'error': None}
+
+    try:
+        new_entry['hash'] = file_hash(source)
+
+        if entry.get('hash') == new_entry['hash'] and not entry.get('error') and os.path.exists(output):
+            return source, entry, 'skipped'
+
+        text = extract_text(source)
+
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        temp_file = output + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_file, output)
+        status = 'converted'
+    except Exception as error:
+        new_entry['error'] = repr(error)
+        status = 'failed'
+
+    new_entry['seconds'] = round(time.perf_counter() - start, 3)
+
+    return source, new_entry, status
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Computes the SHA-256 hash of a file, reading it in blocks.
+    """
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_file):
+    """
+    Loads the extraction manifest, or returns an empty one.
+    """
+    if not os.path.exists(manifest_file):
+        return {}
+
+    with open(manifest_file, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(manifest_file, manifest):
+    """
+    Writes the extraction manifest to disk via a temporary file.
+    """
+    temp_file = manifest_file + '.tmp'
+
+    with open(temp_file, 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+    os.replace(temp_file, manifest_file)
+
+
+if __name__ == '__main__':
+    extract()
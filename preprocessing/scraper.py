@@ -0,0 +1,220 @@
+"""
+Code used to webscrape legal documents from climatecasechart.com.
+Collects the case pages from the search page, the pdf links from every case page
+and downloads the pdfs to OUTPUT_FOLDER/<year>/<name>.pdf.
+
+The crawl state (frontier, validators of every page and pdf) is checkpointed to a json file,
+so an interrupted run resumes where it stopped. Pages and pdfs are fetched with conditional
+GET requests (ETag / Last-Modified), unchanged ones are answered with 304 and skipped.
+"""
+import asyncio
+import json
+import os
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from bs4 import BeautifulSoup
+
+SEARCH_URL = 'http://climatecasechart.com/search/?fwp_per_page=1700'
+
+
+def crawl(search_url=SEARCH_URL, output_folder='../pdfs/', state_file='./crawl_state.json', concurrency=10, checkpoint_every=50):
+    """
+    Runs (or resumes) a crawl, see crawl_async().
+    """
+    return asyncio.run(crawl_async(search_url, output_folder, state_file, concurrency, checkpoint_every))
+
+
+async def crawl_async(search_url, output_folder, state_file, concurrency, checkpoint_every):
+    """
+    Scrapes the search page, all case pages and all pdfs with at most `concurrency` requests at a time.
+    A run that was interrupted continues with its remaining frontier instead of starting over.
+    Returns the crawl state.
+    """
+    state = load_state(state_file)
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+        if not state['pending_cases'] and not state['pending_pdfs']:
+            state['failed'] = []
+            cases = await fetch_links(session, search_url, state, lambda href: '/case/' in href, semaphore)
+            state['pending_cases'] = cases
+            save_state(state_file, state)
+            print(f"Found {len(cases)} cases")
+
+        if state['pending_cases']:
+            await run_frontier(state, 'pending_cases', state_file, checkpoint_every,
+                               lambda case: fetch_links(session, case, state, lambda href: '.pdf' in href, semaphore))
+
+            pdfs = {}
+            for case in state['pages'][search_url]['links']:
+                for pdf in state['pages'].get(case, {}).get('links', []):
+                    pdfs.setdefault(pdf, case)
+
+            state['pending_pdfs'] = list(pdfs)
+            for pdf, case in pdfs.items():
+                state['pdfs'].setdefault(pdf, {})['case'] = case
+            save_state(state_file, state)
+
+        await run_frontier(state, 'pending_pdfs', state_file, checkpoint_every,
+                           lambda pdf: download_pdf(session, pdf, output_folder, state, semaphore))
+
+    return state
+
+
+async def run_frontier(state, frontier, state_file, checkpoint_every, fetch):
+    """
+    Processes all urls of state[frontier] concurrently.
+    Finished urls are removed from the frontier, which is checkpointed every `checkpoint_every` urls.
+    Urls that fail are listed in state['failed'], the next run fetches them again.
+    """
+    urls = list(state[frontier])
+    remaining = set(urls)
+    failed = []
+    done = 0
+
+    async def process(url):
+        nonlocal done
+        try:
+            await fetch(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as error:
+            print(f"Error occurred while fetching {url}: {error}")
+            failed.append(url)
+        remaining.discard(url)
+        done += 1
+
+        if done % checkpoint_every == 0:
+            state[frontier] = [url for url in urls if url in remaining] + failed
+            save_state(state_file, state)
+            print(f"\r{done} / {len(urls)} scraped", end='', flush=True)
+
+    await asyncio.gather(*(process(url) for url in urls))
+
+    state[frontier] = []
+    state['failed'] = sorted(set(state.get('failed', [])) | set(failed))
+    save_state(state_file, state)
+    print(f"\r{done} / {len(urls)} scraped, {len(failed)} failed")
+
+
+async def fetch_links(session, url, state, keep, semaphore):
+    """
+    Fetches a page with a conditional GET and stores the links for which keep(href) is true.
+    When the page is unchanged (304) the stored links are reused.
+    Returns the list of links.
+    """
+    page = state['pages'].get(url, {})
+
+    async with semaphore:
+        async with session.get(url, headers=conditional_headers(page)) as response:
+            if response.status == 304 and 'links' in page:
+                return page['links']
+            response.raise_for_status()
+            html = await response.text()
+
+    soup = BeautifulSoup(html, 'html.parser')
+    links = []
+    for link in soup.find_all('a'):
+        href = link.get('href')
+        if href and keep(href):
+            links.append(urljoin(url, href))
+
+    links = list(dict.fromkeys(links))
+    state['pages'][url] = {**validators(response), 'links': links}
+
+    return links
+
+
+async def download_pdf(session, url, output_folder, state, semaphore):
+    """
+    Downloads one pdf with a conditional GET, streaming it to disk in chunks.
+    The file is written to a temporary name first and renamed when complete.
+    """
+    record = state['pdfs'].setdefault(url, {})
+    path = pdf_path(url, output_folder)
+    headers = conditional_headers(record) if os.path.exists(path) else {}
+
+    async with semaphore:
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304:
+                return
+            response.raise_for_status()
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + '.part'
+
+            with open(temp_path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    f.write(chunk)
+
+            os.replace(temp_path, path)
+
+    record.update(validators(response), path=path)
+
+
+def pdf_path(url, output_folder):
+    """
+    Maps a pdf url to OUTPUT_FOLDER/<year>/<name>.pdf.
+    The year is taken from the url (.../case-documents/<year>/<name>.pdf) or from the file name.
+    """
+    parts = urlsplit(url).path.split('/')
+    name = parts[-1]
+
+    if len(parts) > 1 and parts[-2].isnumeric() and len(parts[-2]) == 4:
+        year = parts[-2]
+    elif name[:4].isnumeric():
+        year = name[:4]
+    else:
+        year = 'unknown'
+
+    return os.path.join(output_folder, year, name)
+
+
+def conditional_headers(record):
+    """
+    Builds If-None-Match / If-Modified-Since headers from stored validators.
+    """
+    headers = {}
+
+    if record.get('etag'):
+        headers['If-None-Match'] = record['etag']
+    if record.get('last_modified'):
+        headers['If-Modified-Since'] = record['last_modified']
+
+    return headers
+
+
+def validators(response):
+    """
+    Returns the ETag and Last-Modified headers of a response.
+    """
+    return {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+
+
+def load_state(state_file):
+    """
+    Loads the crawl state, or returns an empty one.
+    """
+    state = {'pending_cases': [], 'pending_pdfs': [], 'pages': {}, 'pdfs': {}, 'failed': []}
+
+    if os.path.exists(state_file):
+        with open(state_file, 'r') as f:
+            state.update(json.load(f))
+
+    return state
+
+
+def save_state(state_file, state):
+    """
+    Writes the crawl state to disk via a temporary file.
+    """
+    temp_file = state_file + '.tmp'
+
+    with open(temp_file, 'w') as f:
+        json.dump(state, f)
+
+    os.replace(temp_file, state_file)
+
+
+if __name__ == '__main__':
+    crawl()
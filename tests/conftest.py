@@ -0,0 +1,32 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# The modules are run as scripts from their folders, make them importable as such
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for folder in ('', 'analysis_entities', 'analysis_words', 'analysis_global', 'analysis_topics', 'preprocessing'):
+    sys.path.insert(0, os.path.join(root, folder))
+
+
+@pytest.fixture
+def serve():
+    """
+    Starts local stand-in servers: serve(handler class) returns the base url of a server on a free port.
+    The servers are stopped after the test.
+    """
+    servers = []
+
+    def start(handler):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
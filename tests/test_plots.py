@@ -0,0 +1,64 @@
+import os
+
+import pandas as pd
+import pytest
+
+import plots
+
+# The per-year trace version of the bubble chart serialized to about 116 KB
+MAX_BUBBLE_CHART_BYTES = 32 * 1024
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+entities_file = os.path.join(root, 'analysis_entities', 'entities_timeline.csv')
+cases_file = os.path.join(root, 'analysis_global', 'worldmap.csv')
+
+
+@pytest.fixture
+def entities():
+    return pd.read_csv(entities_file)
+
+
+def bubbles(fig):
+    return [(entity, year) for trace in fig.data for entity, year in zip(trace.y, trace.x)]
+
+
+def test_bubble_chart_size(entities):
+    assert plots.figure_size(plots.bubble_chart(entities)) < MAX_BUBBLE_CHART_BYTES
+
+
+def test_bubble_chart_bubbles(entities):
+    fig = plots.bubble_chart(entities)
+    years = [year for year in entities.columns[1:] if int(year) >= 2004]
+
+    # Every (entity, year) bubble is emitted exactly once
+    assert len(bubbles(fig)) == len(set(bubbles(fig)))
+    assert set(bubbles(fig)) == {(entity, year) for entity in entities['Entity'] for year in years}
+
+
+def test_bubble_chart_over_budget(entities):
+    fig = plots.bubble_chart(entities, max_bytes=MAX_BUBBLE_CHART_BYTES // 4)
+
+    assert plots.figure_size(fig) <= MAX_BUBBLE_CHART_BYTES // 4
+    assert {entity for entity, _ in bubbles(fig)} < set(entities['Entity'])
+
+
+@pytest.fixture
+def cases():
+    return pd.read_csv(cases_file)
+
+
+def test_world_map_missing_coordinates(cases):
+    cases.loc[cases.index[0], ['latitude', 'longitude']] = float('nan')
+
+    assert plots.world_map(cases).get_root().render()
+
+
+def test_grid_clusters_missing_terms(cases):
+    cases = cases.head(50).copy()
+    cases.loc[cases.index[:10], 'ESG-term'] = float('nan')
+    # Cases far apart from the others, so the cells of the first ten cases only have missing terms
+    cases.loc[cases.index[:10], ['latitude', 'longitude']] = (-80.5, 170.5)
+
+    features = plots.grid_clusters(cases, max_cells=len(cases))['features']
+
+    assert sum(feature['properties']['count'] for feature in features) == len(cases)
@@ -0,0 +1,72 @@
+import hashlib
+import os
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from scraper import crawl
+
+pages = {
+    '/search/': b'<a href="/case/first-case/">First case</a> <a href="/about/">About</a>',
+    '/case/first-case/': b'<a href="/case-documents/2020/20200101_first.pdf">First</a> <a href="/case-documents/2021/20210101_second.pdf">Second</a>',
+    '/case-documents/2020/20200101_first.pdf': b'%PDF-1.4 first',
+    '/case-documents/2021/20210101_second.pdf': b'%PDF-1.4 second',
+}
+
+documents = [('2020', '20200101_first.pdf'), ('2021', '20210101_second.pdf')]
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        body = pages.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.end_headers()
+            self.requests.append((self.path, 404))
+            return
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        status = 304 if self.headers.get('If-None-Match') == etag else 200
+        self.requests.append((self.path, status))
+
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        if status == 200:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status == 200:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(serve):
+    Handler.requests = []
+    return serve(Handler)
+
+
+def test_crawl_and_recrawl(server, tmp_path):
+    output_folder, state_file = str(tmp_path / 'pdfs'), str(tmp_path / 'crawl_state.json')
+
+    state = crawl(f"{server}/search/", output_folder, state_file)
+
+    assert sorted(Handler.requests) == sorted((path, 200) for path in pages)
+    assert not state['pending_cases'] and not state['pending_pdfs'] and not state['failed']
+    for year, name in documents:
+        with open(os.path.join(output_folder, year, name), 'rb') as f:
+            assert f.read() == pages[f"/case-documents/{year}/{name}"]
+        assert state['pdfs'][f"{server}/case-documents/{year}/{name}"]['case'] == f"{server}/case/first-case/"
+
+    # The rerun only sends conditional requests, every page and pdf is unchanged
+    Handler.requests = []
+    modified = {name: os.path.getmtime(os.path.join(output_folder, year, name)) for year, name in documents}
+
+    state = crawl(f"{server}/search/", output_folder, state_file)
+
+    assert sorted(Handler.requests) == sorted((path, 304) for path in pages)
+    assert not state['pending_cases'] and not state['pending_pdfs'] and not state['failed']
+    assert {name: os.path.getmtime(os.path.join(output_folder, year, name)) for year, name in documents} == modified
@@ -0,0 +1,52 @@
+import json
+import socket
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from url_check import validate_urls
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.send_response(200 if self.path == '/valid.pdf' else 404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(serve):
+    return serve(Handler)
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_validate_urls(server, tmp_path):
+    cache_file = str(tmp_path / 'url_cache.json')
+    valid, missing, refused = f"{server}/valid.pdf", f"{server}/missing.pdf", f"http://127.0.0.1:{closed_port()}/refused.pdf"
+
+    results = validate_urls([valid, missing, refused], cache_file=cache_file, retries=0, host_interval=0)
+
+    assert results == {valid: True, missing: False, refused: False}
+
+    with open(cache_file) as f:
+        cache = json.load(f)
+
+    # Connection errors are not cached, so the url is checked again next run
+    assert {url: entry['valid'] for url, entry in cache.items()} == {valid: True, missing: False}
+
+
+def test_validate_urls_cached(server, tmp_path):
+    cache_file = str(tmp_path / 'url_cache.json')
+    url = f"{server}/valid.pdf"
+    with open(cache_file, 'w') as f:
+        json.dump({url: {'valid': False, 'checked': 4102444800}}, f)
+
+    # Fresh cache entries are answered without a request
+    assert validate_urls([url], cache_file=cache_file) == {url: False}